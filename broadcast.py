@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Any, Dict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from database import AsyncDatabase
+from fanout import FAN_OUT_LIMIT, fan_out
+
+
+class Broadcaster:
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        batch_size: int = 500,
+        concurrency: int = FAN_OUT_LIMIT,
+        retry_delay: float = 30.0,
+        deliver: bool = True,
+    ) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        self.deliver = deliver
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    @property
+    def active(self) -> int:
+        return len(self._tasks)
+
+    async def start(self, bot: Bot, admin_chat_id: int, from_chat_id: int, message_id: int) -> int:
+        broadcast_id = await self.db.create_broadcast(admin_chat_id, from_chat_id, message_id)
+        if self.deliver:
+            self._spawn(bot, broadcast_id)
+        return broadcast_id
+
+    async def resume(self, bot: Bot) -> None:
+        for row in await self.db.list_running_broadcasts():
+            self._spawn(bot, int(row["id"]))
+
+    async def watch(self, bot: Bot, interval: float = 2.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.resume(bot)
+            except Exception:
+                logging.exception("Broadcast watch failed")
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, bot: Bot, broadcast_id: int) -> None:
+        if broadcast_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(bot, broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def _run(self, bot: Bot, broadcast_id: int) -> None:
+        while True:
+            try:
+                await self._send_all(bot, broadcast_id)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Broadcast %s interrupted, resuming in %ss", broadcast_id, self.retry_delay)
+                await asyncio.sleep(self.retry_delay)
+
+    async def _send_all(self, bot: Bot, broadcast_id: int) -> None:
+        broadcast = await self.db.get_broadcast(broadcast_id)
+        if broadcast is None or broadcast["status"] != "running":
+            return
+        from_chat_id = int(broadcast["from_chat_id"])
+        message_id = int(broadcast["message_id"])
+        last_user_tg_id = int(broadcast["last_user_tg_id"])
+
+        while True:
+            recipients = await self.db.list_broadcast_recipients(last_user_tg_id, self.batch_size)
+            if not recipients:
+                break
+            deliveries = await fan_out(
+                recipients,
+                lambda user_id: bot.copy_message(chat_id=user_id, from_chat_id=from_chat_id, message_id=message_id),
+                limit=self.concurrency,
+            )
+            blocked = [d.recipient for d in deliveries if isinstance(d.error, TelegramForbiddenError)]
+            failed = sum(1 for d in deliveries if d.error is not None) - len(blocked)
+            last_user_tg_id = recipients[-1]
+            await self.db.save_broadcast_progress(
+                broadcast_id, last_user_tg_id, len(recipients) - failed - len(blocked), failed, blocked
+            )
+
+        await self.db.finish_broadcast(broadcast_id, "done")
+        summary = await self.db.get_broadcast(broadcast_id)
+        await self._report(bot, summary)
+
+    async def _report(self, bot: Bot, broadcast: Any) -> None:
+        try:
+            await bot.send_message(
+                int(broadcast["admin_chat_id"]),
+                f"Xabar yuborish #{broadcast['id']} tugadi.\n"
+                f"Yuborildi: {broadcast['sent']}\n"
+                f"Bloklaganlar: {broadcast['blocked']}\n"
+                f"Xato: {broadcast['failed']}",
+            )
+        except Exception:
+            logging.exception("Broadcast %s report failed", broadcast["id"])
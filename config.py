@@ -1,4 +1,5 @@
 import os
+import re
 from dataclasses import dataclass
 from typing import Optional
 
@@ -11,6 +12,41 @@ class Config:
     super_admin_id: int
     admin2_id: Optional[int] = None
     db_path: str = "bot.db"
+    db_mode: str = "default"
+    db_read_pool_size: int = 4
+    db_commit_interval_ms: int = 5
+    db_commit_batch_size: int = 64
+    subscription_ttl_seconds: int = 600
+    subscription_negative_ttl_seconds: int = 30
+    subscription_check_mode: str = "live"
+    rate_limit_global_per_second: int = 30
+    rate_limit_chat_per_second: int = 1
+    rate_limit_group_per_minute: int = 20
+    run_mode: str = "polling"
+    webhook_base_url: Optional[str] = None
+    webhook_path: str = "/webhook"
+    webhook_secret: Optional[str] = None
+    webapp_host: str = "0.0.0.0"
+    webapp_port: int = 8080
+    webhook_max_concurrent_updates: int = 32
+    birthday_notify_hour: int = 0
+    workers: int = 1
+    worker_max_concurrent_updates: int = 32
+    flood_burst: int = 5
+    flood_rate_per_minute: int = 30
+
+
+def _read_positive_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be integer") from exc
+    if value < 1:
+        raise RuntimeError(f"{name} must be positive")
+    return value
 
 
 def load_config() -> Config:
@@ -38,9 +74,86 @@ def load_config() -> Config:
             raise RuntimeError("ADMIN2_ID must be integer") from exc
 
     db_path = os.getenv("DB_PATH", "bot.db").strip() or "bot.db"
+
+    db_mode = os.getenv("DB_MODE", "default").strip().lower() or "default"
+    if db_mode not in ("default", "wal"):
+        raise RuntimeError("DB_MODE must be 'default' or 'wal'")
+
+    db_read_pool_size = _read_positive_int("DB_READ_POOL_SIZE", 4)
+    db_commit_interval_ms = _read_positive_int("DB_COMMIT_INTERVAL_MS", 5)
+    db_commit_batch_size = _read_positive_int("DB_COMMIT_BATCH_SIZE", 64)
+    subscription_ttl_seconds = _read_positive_int("SUBSCRIPTION_TTL_SECONDS", 600)
+    subscription_negative_ttl_seconds = _read_positive_int("SUBSCRIPTION_NEGATIVE_TTL_SECONDS", 30)
+
+    rate_limit_global_per_second = _read_positive_int("RATE_LIMIT_GLOBAL_PER_SECOND", 30)
+    rate_limit_chat_per_second = _read_positive_int("RATE_LIMIT_CHAT_PER_SECOND", 1)
+    rate_limit_group_per_minute = _read_positive_int("RATE_LIMIT_GROUP_PER_MINUTE", 20)
+
+    run_mode = os.getenv("RUN_MODE", "polling").strip().lower() or "polling"
+    if run_mode not in ("polling", "webhook"):
+        raise RuntimeError("RUN_MODE must be 'polling' or 'webhook'")
+
+    webhook_base_url = os.getenv("WEBHOOK_BASE_URL", "").strip().rstrip("/") or None
+    webhook_path = os.getenv("WEBHOOK_PATH", "/webhook").strip() or "/webhook"
+    if not webhook_path.startswith("/"):
+        raise RuntimeError("WEBHOOK_PATH must start with '/'")
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip() or None
+    if webhook_secret and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", webhook_secret):
+        raise RuntimeError("WEBHOOK_SECRET must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+    if run_mode == "webhook":
+        if not webhook_base_url:
+            raise RuntimeError("WEBHOOK_BASE_URL env var is required in webhook mode")
+        if not webhook_secret:
+            raise RuntimeError("WEBHOOK_SECRET env var is required in webhook mode")
+    webapp_host = os.getenv("WEBAPP_HOST", "0.0.0.0").strip() or "0.0.0.0"
+    webapp_port = _read_positive_int("WEBAPP_PORT", 8080)
+    webhook_max_concurrent_updates = _read_positive_int("WEBHOOK_MAX_CONCURRENT_UPDATES", 32)
+
+    birthday_notify_hour_raw = os.getenv("BIRTHDAY_NOTIFY_HOUR", "").strip() or "0"
+    try:
+        birthday_notify_hour = int(birthday_notify_hour_raw)
+    except ValueError as exc:
+        raise RuntimeError("BIRTHDAY_NOTIFY_HOUR must be integer") from exc
+    if not 0 <= birthday_notify_hour <= 23:
+        raise RuntimeError("BIRTHDAY_NOTIFY_HOUR must be between 0 and 23")
+
+    flood_burst = _read_positive_int("FLOOD_BURST", 5)
+    flood_rate_per_minute = _read_positive_int("FLOOD_RATE_PER_MINUTE", 30)
+
+    workers = _read_positive_int("WORKERS", 1)
+    worker_max_concurrent_updates = _read_positive_int("WORKER_MAX_CONCURRENT_UPDATES", 32)
+    if workers > 1 and db_mode != "wal":
+        raise RuntimeError("WORKERS > 1 requires DB_MODE=wal")
+
+    subscription_check_mode = os.getenv("SUBSCRIPTION_CHECK_MODE", "live").strip().lower() or "live"
+    if subscription_check_mode not in ("live", "events"):
+        raise RuntimeError("SUBSCRIPTION_CHECK_MODE must be 'live' or 'events'")
+
     return Config(
         bot_token=bot_token,
         super_admin_id=super_admin_id,
         admin2_id=admin2_id,
         db_path=db_path,
+        db_mode=db_mode,
+        db_read_pool_size=db_read_pool_size,
+        db_commit_interval_ms=db_commit_interval_ms,
+        db_commit_batch_size=db_commit_batch_size,
+        subscription_ttl_seconds=subscription_ttl_seconds,
+        subscription_negative_ttl_seconds=subscription_negative_ttl_seconds,
+        subscription_check_mode=subscription_check_mode,
+        rate_limit_global_per_second=rate_limit_global_per_second,
+        rate_limit_chat_per_second=rate_limit_chat_per_second,
+        rate_limit_group_per_minute=rate_limit_group_per_minute,
+        run_mode=run_mode,
+        webhook_base_url=webhook_base_url,
+        webhook_path=webhook_path,
+        webhook_secret=webhook_secret,
+        webapp_host=webapp_host,
+        webapp_port=webapp_port,
+        webhook_max_concurrent_updates=webhook_max_concurrent_updates,
+        birthday_notify_hour=birthday_notify_hour,
+        workers=workers,
+        worker_max_concurrent_updates=worker_max_concurrent_updates,
+        flood_burst=flood_burst,
+        flood_rate_per_minute=flood_rate_per_minute,
     )
@@ -1,146 +1,648 @@
+import asyncio
+import functools
+import itertools
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+
+STORAGE_MODES = ("default", "wal")
+
+WAL_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+CACHE_VERSIONS = itertools.count(1)
+
+CACHE_EPOCH_NAMES = ("settings", "admins", "custom_menus", "channels", "languages", "message_links")
+
+
+class CustomMenuIndex(NamedTuple):
+    version: int
+    by_button: Dict[str, sqlite3.Row]
+    buttons: Tuple[str, ...]
+
+
+class ChannelList(NamedTuple):
+    version: int
+    channels: Tuple[sqlite3.Row, ...]
+
+
+class LruCache:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.epoch = 0
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def fill(self, key: Any, value: Any, epoch: int) -> None:
+        with self._lock:
+            if epoch == self.epoch:
+                self._store(key, value)
+
+    def update(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._store(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+
+    def discard(self, predicate: Callable[[Any, Any], bool]) -> None:
+        with self._lock:
+            self.epoch += 1
+            for key in [key for key, value in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+    def _store(self, key: Any, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
 
 
 def utc_now() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
+BASE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tg_id INTEGER NOT NULL UNIQUE,
+        username TEXT,
+        full_name TEXT,
+        language TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        phone TEXT,
+        birth_date TEXT,
+        registered_at TEXT,
+        no_payment_attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admins (
+        tg_id INTEGER PRIMARY KEY
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS channels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_ref TEXT NOT NULL UNIQUE,
+        join_url TEXT,
+        title TEXT,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_name TEXT NOT NULL,
+        card_number TEXT NOT NULL,
+        is_active INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS custom_menus (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        button_text TEXT NOT NULL UNIQUE,
+        response_text TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_tg_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        receipt_file_id TEXT NOT NULL,
+        receipt_type TEXT NOT NULL,
+        receipt_caption TEXT,
+        admin_tg_id INTEGER,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_credits (
+        user_tg_id INTEGER PRIMARY KEY,
+        credits INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS message_links (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_tg_id INTEGER NOT NULL,
+        user_message_id INTEGER,
+        admin_chat_id INTEGER NOT NULL,
+        admin_message_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS birthday_notifications (
+        user_tg_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        notified_at TEXT NOT NULL,
+        PRIMARY KEY (user_tg_id, year)
+    )
+    """,
+)
+
+LEGACY_COLUMNS = (
+    ("users", "first_name", "TEXT"),
+    ("users", "last_name", "TEXT"),
+    ("users", "phone", "TEXT"),
+    ("users", "birth_date", "TEXT"),
+    ("users", "registered_at", "TEXT"),
+    ("users", "language", "TEXT"),
+    ("message_links", "user_message_id", "INTEGER"),
+)
+
+DEFAULT_SETTINGS = (
+    ("instagram_url", ""),
+    ("suspicious_threshold", "3"),
+    ("inbox_chat_id", ""),
+)
+
+
+def _ensure_column(conn: sqlite3.Connection, table_name: str, column_name: str, definition: str) -> None:
+    rows = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+    existing = {str(row["name"]) for row in rows}
+    if column_name in existing:
+        return
+    conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}")
+
+
+def _migration_base_schema(conn: sqlite3.Connection) -> None:
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    for table_name, column_name, definition in LEGACY_COLUMNS:
+        _ensure_column(conn, table_name, column_name, definition)
+    conn.executemany("INSERT OR IGNORE INTO settings(key, value) VALUES (?, ?)", DEFAULT_SETTINGS)
+
+
+def _migration_lookup_indexes(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_user_status ON payments(user_tg_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status)")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_message_links_admin_message
+        ON message_links(admin_chat_id, admin_message_id, user_tg_id, user_message_id)
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_message_links_user ON message_links(user_tg_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_birth_month_day ON users(substr(birth_date, 6, 5))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_active ON cards(is_active)")
+
+
+def _migration_channel_members(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "channels", "chat_id", "INTEGER")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_members (
+            user_tg_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            is_member INTEGER NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (user_tg_id, chat_id)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channel_members_chat ON channel_members(chat_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_channel_members_updated ON channel_members(updated_at)")
+
+
+def _migration_outbox(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            method TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, id)")
+
+
+def _migration_outbox_links(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "outbox", "link_user_tg_id", "INTEGER")
+    _ensure_column(conn, "outbox", "link_user_message_id", "INTEGER")
+
+
+def _migration_broadcasts(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "users", "blocked_at", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_blocked ON users(blocked_at) WHERE blocked_at IS NOT NULL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_chat_id INTEGER NOT NULL,
+            from_chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_tg_id INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status)")
+
+
+def _migration_jobs(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            name TEXT PRIMARY KEY,
+            task TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            next_run_at TEXT NOT NULL,
+            last_run_at TEXT,
+            last_duration_ms INTEGER,
+            last_error TEXT,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            missed INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+def _migration_cache_epochs(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_epochs (
+            name TEXT PRIMARY KEY,
+            epoch INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def _migration_outbox_chat_heads(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status_chat ON outbox(status, chat_id, id)")
+
+
+def _migration_outbox_refunds(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "outbox", "refund_user_tg_id", "INTEGER")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_outbox_link
+        ON outbox(link_user_tg_id, link_user_message_id)
+        WHERE link_user_tg_id IS NOT NULL
+        """
+    )
+
+
+def _migration_fsm_states(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            storage_key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+MIGRATIONS: Tuple[Callable[[sqlite3.Connection], None], ...] = (
+    _migration_base_schema,
+    _migration_lookup_indexes,
+    _migration_channel_members,
+    _migration_outbox,
+    _migration_fsm_states,
+    _migration_outbox_links,
+    _migration_broadcasts,
+    _migration_jobs,
+    _migration_cache_epochs,
+    _migration_outbox_chat_heads,
+    _migration_outbox_refunds,
+)
+
+
+OutboxItem = Tuple[str, str, str, Optional[int], Optional[int], Optional[int]]
+
+WriteJob = Tuple["Future[Any]", Callable[..., Any], tuple, Dict[str, Any]]
+WriteOutcome = Tuple["Future[Any]", Any, Optional[BaseException]]
+
+COMMIT_RETRIES = 5
+COMMIT_RETRY_DELAY = 0.05
+
+
+def _is_busy(exc: sqlite3.Error) -> bool:
+    message = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def _writes(method: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(method)
+    def wrapper(self: "Database", *args: Any, **kwargs: Any) -> Any:
+        if threading.current_thread() is self._writer:
+            return method(self, *args, **kwargs)
+        return self.submit_write(method, self, *args, **kwargs).result()
+
+    wrapper.write_method = method  # type: ignore[attr-defined]
+    return wrapper
+
+
+def _in_memory(method: Callable[..., Any]) -> Callable[..., Any]:
+    method.in_memory = True  # type: ignore[attr-defined]
+    return method
+
+
 class Database:
-    def __init__(self, path: str) -> None:
+    def __init__(
+        self,
+        path: str,
+        mode: str = "default",
+        read_pool_size: int = 4,
+        commit_interval: float = 0.005,
+        commit_batch_size: int = 64,
+        language_cache_size: int = 10_000,
+        message_link_cache_size: int = 10_000,
+    ) -> None:
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.read_pool_size = 0
+        self.commit_interval = commit_interval
+        self.commit_batch_size = commit_batch_size
+        self._write_lock = threading.Lock()
+        self._write_queue: "queue.Queue[Optional[WriteJob]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._on_commit: List[Callable[[], None]] = []
+        self._settings: Dict[str, Optional[str]] = {}
+        self._admin_ids: FrozenSet[int] = frozenset()
+        self._custom_menus = CustomMenuIndex(0, {}, ())
+        self._channels = ChannelList(0, ())
+        self._languages = LruCache(language_cache_size)
+        self._message_links = LruCache(message_link_cache_size)
+        self._cache_epochs: Dict[str, int] = {}
+        self._data_version = 0
+        self.settings_hits = 0
+        self.settings_misses = 0
+
         self.conn = sqlite3.connect(path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
-        self._init_schema()
-        self._seed_defaults()
+        if mode == "wal":
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA busy_timeout = 5000")
+            for pragma in WAL_PRAGMAS:
+                self.conn.execute(pragma)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self._migrate()
+        self._data_version = int(self.conn.execute("PRAGMA data_version").fetchone()[0])
+        self._cache_epochs = self._load_cache_epochs()
+        self._settings = self._load_settings()
+        self._admin_ids = self._load_admin_ids()
+        self._custom_menus = self._load_custom_menus()
+        self._channels = self._load_channels()
+        self._writer.start()
+        if mode == "wal":
+            for _ in range(read_pool_size):
+                self._readers.put(self._connect_reader())
+            self.read_pool_size = read_pool_size
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        uri = f"{Path(self.path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA query_only = ON")
+        for pragma in WAL_PRAGMAS[1:]:
+            conn.execute(pragma)
+        return conn
 
     def close(self) -> None:
+        self._write_queue.put(None)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
         self.conn.close()
 
+    def submit_write(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        self._write_queue.put((future, func, args, kwargs))
+        return future
+
+    def _writer_loop(self) -> None:
+        running = True
+        while running:
+            job = self._write_queue.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.commit_batch_size:
+                try:
+                    job = self._write_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if job is None:
+                    running = False
+                    break
+                batch.append(job)
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: List[WriteJob]) -> None:
+        jobs = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        attempt = 0
+        while True:
+            attempt += 1
+            outcomes, error = self._run_batch(jobs)
+            if error is None or not _is_busy(error) or attempt >= COMMIT_RETRIES:
+                break
+            time.sleep(COMMIT_RETRY_DELAY * attempt)
+        if error is not None:
+            outcomes = [(job[0], None, error) for job in jobs]
+
+        for future, result, job_error in outcomes:
+            if job_error is not None:
+                future.set_exception(job_error)
+            else:
+                future.set_result(result)
+
+    def _run_batch(self, jobs: List[WriteJob]) -> Tuple[List[WriteOutcome], Optional[sqlite3.Error]]:
+        outcomes: List[WriteOutcome] = []
+        with self._write_lock:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for future, func, args, kwargs in jobs:
+                    self.conn.execute("SAVEPOINT write_job")
+                    hooks_mark = len(self._on_commit)
+                    try:
+                        result = func(*args, **kwargs)
+                    except Exception as exc:
+                        self.conn.execute("ROLLBACK TO write_job")
+                        del self._on_commit[hooks_mark:]
+                        outcomes.append((future, None, exc))
+                    else:
+                        outcomes.append((future, result, None))
+                    self.conn.execute("RELEASE write_job")
+                self.conn.commit()
+            except sqlite3.Error as exc:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                self._on_commit = []
+                return [], exc
+            hooks, self._on_commit = self._on_commit, []
+            for hook in hooks:
+                hook()
+        return outcomes, None
+
+    @contextmanager
+    def _read_conn(self) -> Iterator[sqlite3.Connection]:
+        if threading.current_thread() is self._writer:
+            yield self.conn
+            return
+        if not self.read_pool_size:
+            with self._write_lock:
+                yield self.conn
+            return
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
     def _execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
-        cur = self.conn.execute(query, params)
-        self.conn.commit()
-        return cur
+        return self.conn.execute(query, params)
 
     def _fetchone(self, query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
-        cur = self.conn.execute(query, params)
-        return cur.fetchone()
+        with self._read_conn() as conn:
+            return conn.execute(query, params).fetchone()
 
     def _fetchall(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
-        cur = self.conn.execute(query, params)
-        return cur.fetchall()
+        with self._read_conn() as conn:
+            return conn.execute(query, params).fetchall()
 
-    def _ensure_column(self, table_name: str, column_name: str, definition: str) -> None:
-        rows = self._fetchall(f"PRAGMA table_info({table_name})")
-        existing = {str(row["name"]) for row in rows}
-        if column_name in existing:
+    def _migrate(self) -> None:
+        if int(self.conn.execute("PRAGMA user_version").fetchone()[0]) >= len(MIGRATIONS):
             return
-        self._execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}")
-
-    def _init_schema(self) -> None:
-        self.conn.executescript(
-            """
-            PRAGMA foreign_keys = ON;
-
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tg_id INTEGER NOT NULL UNIQUE,
-                username TEXT,
-                full_name TEXT,
-                language TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                phone TEXT,
-                birth_date TEXT,
-                registered_at TEXT,
-                no_payment_attempts INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS admins (
-                tg_id INTEGER PRIMARY KEY
-            );
-
-            CREATE TABLE IF NOT EXISTS channels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_ref TEXT NOT NULL UNIQUE,
-                join_url TEXT,
-                title TEXT,
-                created_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS cards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                owner_name TEXT NOT NULL,
-                card_number TEXT NOT NULL,
-                is_active INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS custom_menus (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                button_text TEXT NOT NULL UNIQUE,
-                response_text TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS payments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_tg_id INTEGER NOT NULL,
-                status TEXT NOT NULL,
-                receipt_file_id TEXT NOT NULL,
-                receipt_type TEXT NOT NULL,
-                receipt_caption TEXT,
-                admin_tg_id INTEGER,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS user_credits (
-                user_tg_id INTEGER PRIMARY KEY,
-                credits INTEGER NOT NULL DEFAULT 0
-            );
-
-            CREATE TABLE IF NOT EXISTS message_links (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_tg_id INTEGER NOT NULL,
-                user_message_id INTEGER,
-                admin_chat_id INTEGER NOT NULL,
-                admin_message_id INTEGER NOT NULL,
-                created_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS birthday_notifications (
-                user_tg_id INTEGER NOT NULL,
-                year INTEGER NOT NULL,
-                notified_at TEXT NOT NULL,
-                PRIMARY KEY (user_tg_id, year)
-            );
-            """
-        )
-        self._ensure_column("users", "first_name", "TEXT")
-        self._ensure_column("users", "last_name", "TEXT")
-        self._ensure_column("users", "phone", "TEXT")
-        self._ensure_column("users", "birth_date", "TEXT")
-        self._ensure_column("users", "registered_at", "TEXT")
-        self._ensure_column("users", "language", "TEXT")
-        self._ensure_column("message_links", "user_message_id", "INTEGER")
-        self.conn.commit()
-
-    def _seed_defaults(self) -> None:
-        self.set_setting_if_missing("instagram_url", "")
-        self.set_setting_if_missing("suspicious_threshold", "3")
-        self.set_setting_if_missing("inbox_chat_id", "")
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = int(self.conn.execute("PRAGMA user_version").fetchone()[0])
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(self.conn)
+                self.conn.execute(f"PRAGMA user_version = {number}")
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def _load_cache_epochs(self) -> Dict[str, int]:
+        rows = self._fetchall("SELECT name, epoch FROM cache_epochs")
+        return {str(row["name"]): int(row["epoch"]) for row in rows}
+
+    def _bump_cache_epoch(self, name: str) -> None:
+        self._execute(
+            """
+            INSERT INTO cache_epochs(name, epoch)
+            VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET epoch = epoch + 1
+            """,
+            (name,),
+        )
+        row = self._fetchone("SELECT epoch FROM cache_epochs WHERE name = ?", (name,))
+        self._on_commit.append(functools.partial(self._note_cache_epoch, name, int(row["epoch"])))
+
+    def _note_cache_epoch(self, name: str, epoch: int) -> None:
+        if self._cache_epochs.get(name, 0) + 1 == epoch:
+            self._cache_epochs = {**self._cache_epochs, name: epoch}
+
+    def _reload_cache(self, name: str) -> Callable[[], None]:
+        if name == "settings":
+            return functools.partial(self._cache_settings, self._load_settings())
+        if name == "admins":
+            return functools.partial(self._cache_admin_ids, self._load_admin_ids())
+        if name == "custom_menus":
+            return functools.partial(self._cache_custom_menus, self._load_custom_menus())
+        if name == "channels":
+            return functools.partial(self._cache_channels, self._load_channels())
+        if name == "languages":
+            return self._languages.clear
+        return self._message_links.clear
+
+    def _cache_epochs_synced(self, epochs: Dict[str, int]) -> None:
+        self._cache_epochs = epochs
+
+    @_writes
+    def sync_caches(self) -> Tuple[str, ...]:
+        data_version = int(self._execute("PRAGMA data_version").fetchone()[0])
+        if data_version == self._data_version:
+            return ()
+        self._data_version = data_version
+        epochs = self._load_cache_epochs()
+        stale = tuple(
+            name for name in CACHE_EPOCH_NAMES if name in epochs and self._cache_epochs.get(name) != epochs[name]
+        )
+        for name in stale:
+            self._on_commit.append(self._reload_cache(name))
+        self._on_commit.append(functools.partial(self._cache_epochs_synced, epochs))
+        return stale
+
+    def _load_settings(self) -> Dict[str, Optional[str]]:
+        rows = self._fetchall("SELECT key, value FROM settings")
+        return {str(row["key"]): row["value"] for row in rows}
 
+    def _cache_settings(self, settings: Dict[str, Optional[str]]) -> None:
+        self._settings = settings
+
+    def _cache_setting(self, key: str, value: str) -> None:
+        self._settings = {**self._settings, key: value}
+
+    @_writes
     def set_setting_if_missing(self, key: str, value: str) -> None:
-        self._execute("INSERT OR IGNORE INTO settings(key, value) VALUES (?, ?)", (key, value))
+        cur = self._execute("INSERT OR IGNORE INTO settings(key, value) VALUES (?, ?)", (key, value))
+        if cur.rowcount > 0:
+            self._bump_cache_epoch("settings")
+            self._on_commit.append(functools.partial(self._cache_setting, key, value))
 
+    @_writes
     def set_setting(self, key: str, value: str) -> None:
         self._execute(
             """
@@ -150,13 +652,23 @@ class Database:
             """,
             (key, value),
         )
+        self._bump_cache_epoch("settings")
+        self._on_commit.append(functools.partial(self._cache_setting, key, value))
 
+    @_in_memory
     def get_setting(self, key: str, default: str = "") -> str:
-        row = self._fetchone("SELECT value FROM settings WHERE key = ?", (key,))
-        if not row:
+        value = self._settings.get(key)
+        if value is None:
+            self.settings_misses += 1
             return default
-        return row["value"] if row["value"] is not None else default
+        self.settings_hits += 1
+        return value
+
+    @_in_memory
+    def settings_cache_stats(self) -> Dict[str, int]:
+        return {"hits": self.settings_hits, "misses": self.settings_misses, "keys": len(self._settings)}
 
+    @_in_memory
     def get_int_setting(self, key: str, default: int) -> int:
         value = self.get_setting(key, str(default))
         try:
@@ -164,24 +676,47 @@ class Database:
         except ValueError:
             return default
 
+    @_writes
     def ensure_super_admin(self, tg_id: int) -> None:
-        self._execute("INSERT OR IGNORE INTO admins(tg_id) VALUES (?)", (tg_id,))
+        self.add_admin(tg_id)
 
+    def _load_admin_ids(self) -> FrozenSet[int]:
+        rows = self._fetchall("SELECT tg_id FROM admins")
+        return frozenset(int(row["tg_id"]) for row in rows)
+
+    def _cache_admin_ids(self, admin_ids: FrozenSet[int]) -> None:
+        self._admin_ids = admin_ids
+
+    def _cache_admin(self, tg_id: int, present: bool) -> None:
+        if present:
+            self._admin_ids = self._admin_ids | {tg_id}
+        else:
+            self._admin_ids = self._admin_ids - {tg_id}
+
+    @_in_memory
     def is_admin(self, tg_id: int) -> bool:
-        row = self._fetchone("SELECT 1 FROM admins WHERE tg_id = ?", (tg_id,))
-        return bool(row)
+        return tg_id in self._admin_ids
 
+    @_writes
     def add_admin(self, tg_id: int) -> None:
-        self._execute("INSERT OR IGNORE INTO admins(tg_id) VALUES (?)", (tg_id,))
+        cur = self._execute("INSERT OR IGNORE INTO admins(tg_id) VALUES (?)", (tg_id,))
+        if cur.rowcount > 0:
+            self._bump_cache_epoch("admins")
+        self._on_commit.append(functools.partial(self._cache_admin, tg_id, True))
 
+    @_writes
     def remove_admin(self, tg_id: int) -> int:
         cur = self._execute("DELETE FROM admins WHERE tg_id = ?", (tg_id,))
+        if cur.rowcount > 0:
+            self._bump_cache_epoch("admins")
+        self._on_commit.append(functools.partial(self._cache_admin, tg_id, False))
         return cur.rowcount
 
+    @_in_memory
     def list_admins(self) -> List[int]:
-        rows = self._fetchall("SELECT tg_id FROM admins ORDER BY tg_id")
-        return [int(row["tg_id"]) for row in rows]
+        return sorted(self._admin_ids)
 
+    @_writes
     def upsert_user(self, tg_id: int, username: Optional[str], full_name: str) -> None:
         self._execute(
             """
@@ -189,7 +724,8 @@ class Database:
             VALUES (?, ?, ?, ?)
             ON CONFLICT(tg_id) DO UPDATE SET
                 username = excluded.username,
-                full_name = excluded.full_name
+                full_name = excluded.full_name,
+                blocked_at = NULL
             """,
             (tg_id, username, full_name, utc_now()),
         )
@@ -198,6 +734,11 @@ class Database:
         row = self._fetchone("SELECT COUNT(*) AS cnt FROM users")
         return int(row["cnt"]) if row else 0
 
+    def blocked_users(self) -> int:
+        row = self._fetchone("SELECT COUNT(*) AS cnt FROM users WHERE blocked_at IS NOT NULL")
+        return int(row["cnt"]) if row else 0
+
+    @_writes
     def increment_no_payment_attempt(self, tg_id: int) -> int:
         self._execute(
             """
@@ -210,29 +751,100 @@ class Database:
         row = self._fetchone("SELECT no_payment_attempts FROM users WHERE tg_id = ?", (tg_id,))
         return int(row["no_payment_attempts"]) if row else 0
 
+    @_writes
     def reset_no_payment_attempts(self, tg_id: int) -> None:
         self._execute(
             "UPDATE users SET no_payment_attempts = 0 WHERE tg_id = ?",
             (tg_id,),
         )
 
-    def add_channel(self, chat_ref: str, join_url: Optional[str], title: Optional[str]) -> None:
+    @_writes
+    def add_channel(
+        self,
+        chat_ref: str,
+        join_url: Optional[str],
+        title: Optional[str],
+        chat_id: Optional[int] = None,
+    ) -> None:
         self._execute(
             """
-            INSERT INTO channels(chat_ref, join_url, title, created_at)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO channels(chat_ref, join_url, title, chat_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(chat_ref) DO UPDATE SET
                 join_url = excluded.join_url,
-                title = COALESCE(excluded.title, channels.title)
+                title = COALESCE(excluded.title, channels.title),
+                chat_id = COALESCE(excluded.chat_id, channels.chat_id)
+            """,
+            (chat_ref, join_url, title, chat_id, utc_now()),
+        )
+        self._refresh_channels()
+
+    @_writes
+    def set_channel_chat_id(self, channel_id: int, chat_id: int) -> None:
+        self._execute("UPDATE channels SET chat_id = ? WHERE id = ?", (chat_id, channel_id))
+        self._refresh_channels()
+
+    def get_channel_memberships(self, user_tg_id: int) -> Dict[int, bool]:
+        rows = self._fetchall(
+            "SELECT chat_id, is_member FROM channel_members WHERE user_tg_id = ?",
+            (user_tg_id,),
+        )
+        return {int(row["chat_id"]): bool(row["is_member"]) for row in rows}
+
+    @_writes
+    def set_channel_member(self, chat_id: int, user_tg_id: int, is_member: bool) -> None:
+        self._execute(
+            """
+            INSERT INTO channel_members(user_tg_id, chat_id, is_member, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_tg_id, chat_id) DO UPDATE SET
+                is_member = excluded.is_member,
+                updated_at = excluded.updated_at
+            """,
+            (user_tg_id, chat_id, int(is_member), utc_now()),
+        )
+
+    @_writes
+    def clear_channel_members(self, chat_id: int) -> int:
+        cur = self._execute("DELETE FROM channel_members WHERE chat_id = ?", (chat_id,))
+        return cur.rowcount
+
+    @_writes
+    def prune_channel_members(self, updated_before: str) -> int:
+        cur = self._execute(
+            """
+            DELETE FROM channel_members
+            WHERE updated_at < ?
+               OR chat_id NOT IN (SELECT chat_id FROM channels WHERE chat_id IS NOT NULL)
             """,
-            (chat_ref, join_url, title, utc_now()),
+            (updated_before,),
         )
+        return cur.rowcount
+
+    def _load_channels(self) -> ChannelList:
+        rows = self._fetchall("SELECT * FROM channels ORDER BY id ASC")
+        return ChannelList(next(CACHE_VERSIONS), tuple(rows))
 
+    def _cache_channels(self, channels: ChannelList) -> None:
+        self._channels = channels
+
+    def _refresh_channels(self) -> None:
+        self._bump_cache_epoch("channels")
+        self._on_commit.append(functools.partial(self._cache_channels, self._load_channels()))
+
+    @_in_memory
     def list_channels(self) -> List[sqlite3.Row]:
-        return self._fetchall("SELECT * FROM channels ORDER BY id ASC")
+        return list(self._channels.channels)
 
+    @_in_memory
+    def channel_list(self) -> ChannelList:
+        return self._channels
+
+    @_writes
     def remove_channel(self, channel_id: int) -> int:
         cur = self._execute("DELETE FROM channels WHERE id = ?", (channel_id,))
+        if cur.rowcount > 0:
+            self._refresh_channels()
         return cur.rowcount
 
     def list_custom_menus(self) -> List[sqlite3.Row]:
@@ -244,6 +856,7 @@ class Database:
             """
         )
 
+    @_writes
     def save_custom_menu(self, button_text: str, response_text: str) -> bool:
         row = self._fetchone(
             "SELECT id FROM custom_menus WHERE button_text = ? LIMIT 1",
@@ -259,6 +872,7 @@ class Database:
                 """,
                 (button_text, response_text, now, int(row["id"])),
             )
+            self._refresh_custom_menus()
             return False
 
         self._execute(
@@ -268,27 +882,43 @@ class Database:
             """,
             (button_text, response_text, now, now),
         )
+        self._refresh_custom_menus()
         return True
 
+    @_writes
     def remove_custom_menu(self, menu_id: int) -> int:
         cur = self._execute("DELETE FROM custom_menus WHERE id = ?", (menu_id,))
+        if cur.rowcount > 0:
+            self._refresh_custom_menus()
         return cur.rowcount
 
+    def _load_custom_menus(self) -> CustomMenuIndex:
+        rows = self._fetchall("SELECT id, button_text, response_text FROM custom_menus ORDER BY id ASC")
+        by_button: Dict[str, sqlite3.Row] = {}
+        for row in rows:
+            by_button.setdefault(str(row["button_text"]), row)
+        buttons = tuple(str(row["button_text"]) for row in rows)
+        return CustomMenuIndex(next(CACHE_VERSIONS), by_button, buttons)
+
+    def _cache_custom_menus(self, index: CustomMenuIndex) -> None:
+        self._custom_menus = index
+
+    def _refresh_custom_menus(self) -> None:
+        self._bump_cache_epoch("custom_menus")
+        self._on_commit.append(functools.partial(self._cache_custom_menus, self._load_custom_menus()))
+
+    @_in_memory
     def get_custom_menu_by_button(self, button_text: str) -> Optional[sqlite3.Row]:
-        return self._fetchone(
-            """
-            SELECT id, button_text, response_text
-            FROM custom_menus
-            WHERE button_text = ?
-            ORDER BY id ASC
-            LIMIT 1
-            """,
-            (button_text,),
-        )
+        return self._custom_menus.by_button.get(button_text)
+
+    @_in_memory
+    def custom_menu_buttons(self) -> Tuple[int, Tuple[str, ...]]:
+        return self._custom_menus.version, self._custom_menus.buttons
 
+    @_writes
     def add_card(self, owner_name: str, card_number: str, activate: bool) -> int:
         if activate:
-            self._execute("UPDATE cards SET is_active = 0")
+            self._execute("UPDATE cards SET is_active = 0 WHERE is_active = 1")
         else:
             row = self._fetchone("SELECT id FROM cards LIMIT 1")
             if not row:
@@ -306,11 +936,12 @@ class Database:
     def list_cards(self) -> List[sqlite3.Row]:
         return self._fetchall("SELECT * FROM cards ORDER BY id ASC")
 
+    @_writes
     def set_active_card(self, card_id: int) -> bool:
         exists = self._fetchone("SELECT id FROM cards WHERE id = ?", (card_id,))
         if not exists:
             return False
-        self._execute("UPDATE cards SET is_active = 0")
+        self._execute("UPDATE cards SET is_active = 0 WHERE is_active = 1")
         self._execute("UPDATE cards SET is_active = 1 WHERE id = ?", (card_id,))
         return True
 
@@ -323,6 +954,7 @@ class Database:
             self.set_active_card(int(row["id"]))
         return row
 
+    @_writes
     def remove_card(self, card_id: int) -> bool:
         row = self._fetchone("SELECT id, is_active FROM cards WHERE id = ?", (card_id,))
         if not row:
@@ -340,6 +972,7 @@ class Database:
         row = self._fetchone("SELECT credits FROM user_credits WHERE user_tg_id = ?", (user_tg_id,))
         return int(row["credits"]) if row else 0
 
+    @_writes
     def add_credits(self, user_tg_id: int, amount: int = 1) -> None:
         self._execute(
             """
@@ -350,6 +983,7 @@ class Database:
             (user_tg_id, amount),
         )
 
+    @_writes
     def consume_credit(self, user_tg_id: int, amount: int = 1) -> bool:
         self._execute(
             "INSERT OR IGNORE INTO user_credits(user_tg_id, credits) VALUES (?, 0)",
@@ -365,6 +999,7 @@ class Database:
         )
         return cur.rowcount > 0
 
+    @_writes
     def create_payment(
         self,
         user_tg_id: int,
@@ -399,6 +1034,7 @@ class Database:
             (user_tg_id,),
         )
 
+    @_writes
     def update_payment_status(self, payment_id: int, status: str, admin_tg_id: int) -> bool:
         cur = self._execute(
             """
@@ -423,6 +1059,7 @@ class Database:
             result[str(row["status"])] = int(row["cnt"])
         return result
 
+    @_writes
     def save_message_link(
         self,
         user_tg_id: int,
@@ -439,6 +1076,13 @@ class Database:
             """,
             (user_tg_id, user_message_id, admin_chat_id, admin_message_id, utc_now()),
         )
+        self._on_commit.append(
+            functools.partial(
+                self._message_links.update,
+                (admin_chat_id, admin_message_id),
+                (user_tg_id, user_message_id),
+            )
+        )
         return int(cur.lastrowid)
 
     def get_message_link(self, admin_chat_id: int, admin_message_id: int) -> Optional[sqlite3.Row]:
@@ -453,18 +1097,17 @@ class Database:
             (admin_chat_id, admin_message_id),
         )
 
-    def get_user_for_admin_message(self, admin_chat_id: int, admin_message_id: int) -> Optional[int]:
-        row = self.get_message_link(admin_chat_id, admin_message_id)
-        if not row:
-            return None
-        return int(row["user_tg_id"])
-
-    def get_user_message_for_admin_message(
+    def get_message_link_target(
         self, admin_chat_id: int, admin_message_id: int
-    ) -> Optional[int]:
+    ) -> Optional[Tuple[int, Optional[int]]]:
+        key = (admin_chat_id, admin_message_id)
+        target = self._message_links.get(key)
+        if target is not None:
+            return target
+        epoch = self._message_links.epoch
         row = self._fetchone(
             """
-            SELECT user_message_id
+            SELECT user_tg_id, user_message_id
             FROM message_links
             WHERE admin_chat_id = ? AND admin_message_id = ?
             ORDER BY id DESC
@@ -474,9 +1117,24 @@ class Database:
         )
         if not row:
             return None
-        if row["user_message_id"] is None:
+        user_message_id = int(row["user_message_id"]) if row["user_message_id"] is not None else None
+        target = (int(row["user_tg_id"]), user_message_id)
+        self._message_links.fill(key, target, epoch)
+        return target
+
+    def get_user_for_admin_message(self, admin_chat_id: int, admin_message_id: int) -> Optional[int]:
+        target = self.get_message_link_target(admin_chat_id, admin_message_id)
+        if not target:
+            return None
+        return target[0]
+
+    def get_user_message_for_admin_message(
+        self, admin_chat_id: int, admin_message_id: int
+    ) -> Optional[int]:
+        target = self.get_message_link_target(admin_chat_id, admin_message_id)
+        if not target:
             return None
-        return int(row["user_message_id"])
+        return target[1]
 
     def total_user_messages(self) -> int:
         row = self._fetchone("SELECT COUNT(*) AS cnt FROM message_links")
@@ -495,12 +1153,18 @@ class Database:
             (tg_id,),
         )
 
+    @_writes
     def delete_user_data(self, tg_id: int) -> bool:
         self._execute("DELETE FROM birthday_notifications WHERE user_tg_id = ?", (tg_id,))
         self._execute("DELETE FROM message_links WHERE user_tg_id = ?", (tg_id,))
         self._execute("DELETE FROM user_credits WHERE user_tg_id = ?", (tg_id,))
+        self._execute("DELETE FROM channel_members WHERE user_tg_id = ?", (tg_id,))
         self._execute("DELETE FROM payments WHERE user_tg_id = ?", (tg_id,))
         cur = self._execute("DELETE FROM users WHERE tg_id = ?", (tg_id,))
+        self._bump_cache_epoch("languages")
+        self._bump_cache_epoch("message_links")
+        self._on_commit.append(functools.partial(self._languages.update, tg_id, ""))
+        self._on_commit.append(functools.partial(self._message_links.discard, lambda _, link: link[0] == tg_id))
         return cur.rowcount > 0
 
     def _refresh_user_full_name(self, tg_id: int) -> None:
@@ -518,6 +1182,7 @@ class Database:
             (full_name, tg_id),
         )
 
+    @_writes
     def update_user_first_name(self, tg_id: int, first_name: str) -> None:
         self._execute(
             "UPDATE users SET first_name = ? WHERE tg_id = ?",
@@ -525,6 +1190,7 @@ class Database:
         )
         self._refresh_user_full_name(tg_id)
 
+    @_writes
     def update_user_last_name(self, tg_id: int, last_name: str) -> None:
         self._execute(
             "UPDATE users SET last_name = ? WHERE tg_id = ?",
@@ -532,12 +1198,14 @@ class Database:
         )
         self._refresh_user_full_name(tg_id)
 
+    @_writes
     def update_user_phone(self, tg_id: int, phone: str) -> None:
         self._execute(
             "UPDATE users SET phone = ? WHERE tg_id = ?",
             (phone, tg_id),
         )
 
+    @_writes
     def update_user_birth_date(self, tg_id: int, birth_date: str) -> None:
         self._execute(
             "UPDATE users SET birth_date = ? WHERE tg_id = ?",
@@ -545,13 +1213,21 @@ class Database:
         )
 
     def get_user_language(self, tg_id: int) -> str:
+        language = self._languages.get(tg_id)
+        if language is not None:
+            return language
+        epoch = self._languages.epoch
         row = self._fetchone("SELECT language FROM users WHERE tg_id = ?", (tg_id,))
-        if not row or not row["language"]:
-            return ""
-        return str(row["language"])
+        language = str(row["language"]) if row and row["language"] else ""
+        self._languages.fill(tg_id, language, epoch)
+        return language
 
+    @_writes
     def set_user_language(self, tg_id: int, language: str) -> None:
-        self._execute("UPDATE users SET language = ? WHERE tg_id = ?", (language, tg_id))
+        cur = self._execute("UPDATE users SET language = ? WHERE tg_id = ?", (language, tg_id))
+        if cur.rowcount > 0:
+            self._bump_cache_epoch("languages")
+            self._on_commit.append(functools.partial(self._languages.update, tg_id, language))
 
     def is_user_registered(self, tg_id: int) -> bool:
         row = self._fetchone(
@@ -566,6 +1242,26 @@ class Database:
             return False
         return bool(row["first_name"] and row["last_name"] and row["phone"] and row["birth_date"])
 
+    def get_user_snapshot(self, tg_id: int) -> sqlite3.Row:
+        return self._fetchone(
+            """
+            SELECT
+                COALESCE(u.language, '') AS language,
+                u.first_name, u.last_name, u.phone, u.birth_date,
+                COALESCE((SELECT credits FROM user_credits WHERE user_tg_id = ?1), 0) AS credits,
+                (
+                    SELECT id FROM payments
+                    WHERE user_tg_id = ?1 AND status = 'pending'
+                    ORDER BY id DESC
+                    LIMIT 1
+                ) AS pending_payment_id
+            FROM (SELECT ?1 AS tg_id) AS target
+            LEFT JOIN users AS u ON u.tg_id = target.tg_id
+            """,
+            (tg_id,),
+        )
+
+    @_writes
     def save_user_registration(
         self,
         tg_id: int,
@@ -596,6 +1292,21 @@ class Database:
             (month_day,),
         )
 
+    def list_unnotified_birthdays(self, month_day: str, year: int) -> List[sqlite3.Row]:
+        return self._fetchall(
+            """
+            SELECT u.tg_id, u.username, u.first_name, u.last_name, u.phone, u.birth_date
+            FROM users AS u
+            WHERE substr(u.birth_date, 6, 5) = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM birthday_notifications AS n
+                  WHERE n.user_tg_id = u.tg_id AND n.year = ?
+              )
+            ORDER BY u.first_name, u.last_name
+            """,
+            (month_day, year),
+        )
+
     def is_birthday_notified(self, user_tg_id: int, year: int) -> bool:
         row = self._fetchone(
             """
@@ -607,6 +1318,7 @@ class Database:
         )
         return bool(row)
 
+    @_writes
     def mark_birthday_notified(self, user_tg_id: int, year: int) -> None:
         self._execute(
             """
@@ -615,3 +1327,311 @@ class Database:
             """,
             (user_tg_id, year, utc_now()),
         )
+
+    @_writes
+    def enqueue_birthday_digest(self, items: List[OutboxItem], user_tg_ids: List[int], year: int) -> int:
+        self.mark_birthdays_notified(user_tg_ids, year)
+        return self.enqueue_outbox(items)
+
+    @_writes
+    def mark_birthdays_notified(self, user_tg_ids: List[int], year: int) -> None:
+        now = utc_now()
+        self.conn.executemany(
+            """
+            INSERT OR IGNORE INTO birthday_notifications(user_tg_id, year, notified_at)
+            VALUES (?, ?, ?)
+            """,
+            [(user_tg_id, year, now) for user_tg_id in user_tg_ids],
+        )
+
+    @_writes
+    def enqueue_outbox(self, items: List[OutboxItem]) -> int:
+        now = utc_now()
+        self.conn.executemany(
+            """
+            INSERT INTO outbox(
+                chat_id, method, payload, link_user_tg_id, link_user_message_id, refund_user_tg_id,
+                next_attempt_at, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(*item, now, now) for item in items],
+        )
+        return len(items)
+
+    def list_due_outbox(self, now: str, limit: int) -> List[sqlite3.Row]:
+        return self._fetchall(
+            """
+            SELECT outbox.*
+            FROM (
+                SELECT MIN(id) AS id
+                FROM outbox
+                WHERE status = 'pending'
+                GROUP BY chat_id
+            ) AS heads
+            JOIN outbox ON outbox.id = heads.id
+            WHERE outbox.next_attempt_at <= ?
+            ORDER BY outbox.id ASC
+            LIMIT ?
+            """,
+            (now, limit),
+        )
+
+    @_writes
+    def complete_outbox(
+        self,
+        outbox_id: int,
+        admin_chat_id: Optional[int] = None,
+        admin_message_id: Optional[int] = None,
+    ) -> None:
+        row = self._fetchone(
+            """
+            SELECT method, link_user_tg_id, link_user_message_id, refund_user_tg_id
+            FROM outbox
+            WHERE id = ?
+            """,
+            (outbox_id,),
+        )
+        if row and row["link_user_tg_id"] is not None:
+            if admin_chat_id is not None and admin_message_id is not None:
+                self.save_message_link(
+                    int(row["link_user_tg_id"]),
+                    admin_chat_id,
+                    admin_message_id,
+                    row["link_user_message_id"],
+                )
+            if row["refund_user_tg_id"] is not None and row["method"] == "CopyMessage":
+                self._clear_outbox_refund(int(row["link_user_tg_id"]), row["link_user_message_id"])
+        self._execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+
+    def _clear_outbox_refund(self, link_user_tg_id: int, link_user_message_id: Optional[int]) -> None:
+        self._execute(
+            """
+            UPDATE outbox
+            SET refund_user_tg_id = NULL
+            WHERE link_user_tg_id = ? AND link_user_message_id IS ?
+            """,
+            (link_user_tg_id, link_user_message_id),
+        )
+
+    @_writes
+    def retry_outbox(self, outbox_id: int, next_attempt_at: str, error: str) -> None:
+        self._execute(
+            """
+            UPDATE outbox
+            SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+            """,
+            (next_attempt_at, error, outbox_id),
+        )
+
+    @_writes
+    def fail_outbox(self, outbox_id: int, error: str) -> Optional[int]:
+        self._execute(
+            """
+            UPDATE outbox
+            SET status = 'failed', attempts = attempts + 1, last_error = ?
+            WHERE id = ?
+            """,
+            (error, outbox_id),
+        )
+        row = self._fetchone(
+            "SELECT link_user_tg_id, link_user_message_id, refund_user_tg_id FROM outbox WHERE id = ?",
+            (outbox_id,),
+        )
+        if not row or row["refund_user_tg_id"] is None:
+            return None
+        pending = self._fetchone(
+            """
+            SELECT 1
+            FROM outbox
+            WHERE link_user_tg_id = ? AND link_user_message_id IS ? AND status = 'pending'
+            LIMIT 1
+            """,
+            (row["link_user_tg_id"], row["link_user_message_id"]),
+        )
+        if pending:
+            return None
+        user_tg_id = int(row["refund_user_tg_id"])
+        self._clear_outbox_refund(int(row["link_user_tg_id"]), row["link_user_message_id"])
+        self.add_credits(user_tg_id, 1)
+        return user_tg_id
+
+    @_writes
+    def purge_failed_outbox(self, created_before: str) -> int:
+        cur = self._execute(
+            "DELETE FROM outbox WHERE status = 'failed' AND created_at < ?",
+            (created_before,),
+        )
+        return cur.rowcount
+
+    def outbox_stats(self) -> Dict[str, int]:
+        rows = self._fetchall("SELECT status, COUNT(*) AS cnt FROM outbox GROUP BY status")
+        return {str(row["status"]): int(row["cnt"]) for row in rows}
+
+    @_writes
+    def create_broadcast(self, admin_chat_id: int, from_chat_id: int, message_id: int) -> int:
+        now = utc_now()
+        cur = self._execute(
+            """
+            INSERT INTO broadcasts(admin_chat_id, from_chat_id, message_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (admin_chat_id, from_chat_id, message_id, now, now),
+        )
+        return int(cur.lastrowid)
+
+    def get_broadcast(self, broadcast_id: int) -> Optional[sqlite3.Row]:
+        return self._fetchone("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+
+    def list_running_broadcasts(self) -> List[sqlite3.Row]:
+        return self._fetchall("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id ASC")
+
+    def list_broadcast_recipients(self, after_tg_id: int, limit: int) -> List[int]:
+        rows = self._fetchall(
+            """
+            SELECT tg_id FROM users
+            WHERE tg_id > ? AND blocked_at IS NULL
+            ORDER BY tg_id ASC
+            LIMIT ?
+            """,
+            (after_tg_id, limit),
+        )
+        return [int(row["tg_id"]) for row in rows]
+
+    @_writes
+    def save_broadcast_progress(
+        self,
+        broadcast_id: int,
+        last_user_tg_id: int,
+        sent: int,
+        failed: int,
+        blocked_ids: List[int],
+    ) -> None:
+        now = utc_now()
+        self.conn.executemany(
+            "UPDATE users SET blocked_at = ? WHERE tg_id = ?",
+            [(now, tg_id) for tg_id in blocked_ids],
+        )
+        self._execute(
+            """
+            UPDATE broadcasts
+            SET last_user_tg_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (last_user_tg_id, sent, failed, len(blocked_ids), now, broadcast_id),
+        )
+
+    @_writes
+    def finish_broadcast(self, broadcast_id: int, status: str) -> None:
+        self._execute(
+            "UPDATE broadcasts SET status = ?, updated_at = ? WHERE id = ?",
+            (status, utc_now(), broadcast_id),
+        )
+
+    def list_jobs(self) -> List[sqlite3.Row]:
+        return self._fetchall("SELECT * FROM jobs ORDER BY name ASC")
+
+    @_writes
+    def save_job(self, name: str, task: str, payload: str, next_run_at: str) -> None:
+        self._execute(
+            """
+            INSERT INTO jobs(name, task, payload, next_run_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                task = excluded.task,
+                payload = excluded.payload,
+                next_run_at = excluded.next_run_at
+            """,
+            (name, task, payload, next_run_at),
+        )
+
+    @_writes
+    def record_job_run(
+        self,
+        name: str,
+        next_run_at: str,
+        started_at: str,
+        duration_ms: int,
+        error: Optional[str],
+        missed: int,
+    ) -> None:
+        self._execute(
+            """
+            UPDATE jobs
+            SET next_run_at = ?, last_run_at = ?, last_duration_ms = ?, last_error = ?,
+                runs = runs + 1, failures = failures + ?, missed = missed + ?
+            WHERE name = ?
+            """,
+            (next_run_at, started_at, duration_ms, error, 1 if error else 0, missed, name),
+        )
+
+    @_writes
+    def delete_job(self, name: str) -> None:
+        self._execute("DELETE FROM jobs WHERE name = ?", (name,))
+
+    def get_fsm_record(self, storage_key: str) -> Optional[sqlite3.Row]:
+        return self._fetchone("SELECT state, data FROM fsm_states WHERE storage_key = ?", (storage_key,))
+
+    @_writes
+    def save_fsm_records(self, records: List[Tuple[str, Optional[str], str]]) -> None:
+        now = utc_now()
+        empty = [(storage_key,) for storage_key, state, data in records if state is None and data == "{}"]
+        filled = [(storage_key, state, data, now) for storage_key, state, data in records if state is not None or data != "{}"]
+        self.conn.executemany("DELETE FROM fsm_states WHERE storage_key = ?", empty)
+        self.conn.executemany(
+            """
+            INSERT INTO fsm_states(storage_key, state, data, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(storage_key) DO UPDATE SET
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            filled,
+        )
+
+
+class AsyncDatabase:
+    def __init__(self, db: Database, max_workers: Optional[int] = None) -> None:
+        self.db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or db.read_pool_size + 1,
+            thread_name_prefix="db",
+        )
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        if getattr(attr, "in_memory", False):
+
+            async def call(*args: Any, **kwargs: Any) -> Any:
+                return attr(*args, **kwargs)
+
+            call.__name__ = name
+            return call
+
+        write_method = getattr(attr, "write_method", None)
+        if write_method is not None:
+
+            async def call(*args: Any, **kwargs: Any) -> Any:
+                return await asyncio.wrap_future(self.db.submit_write(write_method, self.db, *args, **kwargs))
+
+            call.__name__ = name
+            return call
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    async def close(self) -> None:
+        await self.run(self.db.close)
+        self._executor.shutdown(wait=True)
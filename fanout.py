@@ -0,0 +1,35 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, TypeVar
+
+FAN_OUT_LIMIT = 8
+
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class Delivery:
+    recipient: Any
+    result: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def fan_out(
+    recipients: Iterable[R],
+    send: Callable[[R], Awaitable[Any]],
+    limit: int = FAN_OUT_LIMIT,
+) -> List[Delivery]:
+    semaphore = asyncio.Semaphore(limit)
+
+    async def deliver(recipient: R) -> Delivery:
+        async with semaphore:
+            try:
+                return Delivery(recipient, await send(recipient))
+            except Exception as exc:
+                return Delivery(recipient, error=exc)
+
+    return list(await asyncio.gather(*(deliver(recipient) for recipient in recipients)))
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Set, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from database import AsyncDatabase
+
+FsmRecord = Tuple[Optional[str], Dict[str, Any]]
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        key_builder: Optional[KeyBuilder] = None,
+        cache_size: int = 10_000,
+        flush_interval: float = 0.5,
+        flush_batch_size: int = 256,
+    ) -> None:
+        self.db = db
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._cache: "OrderedDict[str, FsmRecord]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        _, data = await self._load(storage_key)
+        value = state.state if isinstance(state, State) else state
+        self._store(storage_key, (value, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        self._store(storage_key, (state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        records = []
+        for storage_key in keys:
+            state, data = self._cache[storage_key]
+            records.append((storage_key, state, json.dumps(data, ensure_ascii=False)))
+        try:
+            await self.db.save_fsm_records(records)
+        except Exception:
+            self._dirty |= keys
+            raise
+
+    async def _load(self, storage_key: str) -> FsmRecord:
+        record = self._cache.get(storage_key)
+        if record is not None:
+            self._cache.move_to_end(storage_key)
+            return record
+        row = await self.db.get_fsm_record(storage_key)
+        record = (row["state"], json.loads(row["data"])) if row else (None, {})
+        cached = self._cache.setdefault(storage_key, record)
+        self._evict()
+        return cached
+
+    def _store(self, storage_key: str, record: FsmRecord) -> None:
+        self._cache[storage_key] = record
+        self._cache.move_to_end(storage_key)
+        self._dirty.add(storage_key)
+        if len(self._dirty) >= self.flush_batch_size:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+        self._evict()
+
+    def _start_flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = asyncio.create_task(self._flush_safely())
+
+    async def _flush_safely(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception("FSM storage flush failed")
+        if self._dirty and self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _evict(self) -> None:
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        for storage_key in list(self._cache):
+            if excess <= 0:
+                break
+            if storage_key in self._dirty:
+                continue
+            del self._cache[storage_key]
+            excess -= 1
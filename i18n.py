@@ -0,0 +1,64 @@
+import json
+import string
+from pathlib import Path
+from typing import Any, Dict, Mapping, Tuple
+
+LOCALES_DIR = Path(__file__).with_name("locales")
+
+_FORMATTER = string.Formatter()
+
+
+class Template:
+    __slots__ = ("text", "has_fields")
+
+    def __init__(self, text: str) -> None:
+        self.has_fields = any(field is not None for _, field, _, _ in _FORMATTER.parse(text))
+        self.text = text if self.has_fields else text.format()
+
+    def render(self, kwargs: Mapping[str, Any]) -> str:
+        if not self.has_fields:
+            return self.text
+        return self.text.format(**kwargs)
+
+
+class Catalog:
+    def __init__(self, catalogs: Mapping[str, Mapping[str, str]], default_lang: str) -> None:
+        if default_lang not in catalogs:
+            raise RuntimeError(f"Default language {default_lang!r} has no catalog")
+        default = catalogs[default_lang]
+        self.default_lang = default_lang
+        self.languages: Tuple[str, ...] = tuple(catalogs)
+        self.labels: Dict[str, str] = {lang: str(values.get("lang_button") or lang) for lang, values in catalogs.items()}
+        self._templates: Dict[str, Dict[str, Template]] = {}
+        for lang, values in catalogs.items():
+            merged = {**default, **{key: text for key, text in values.items() if text}}
+            self._templates[lang] = {key: Template(text) for key, text in merged.items() if text}
+
+    def text(self, lang: str, key: str, **kwargs: Any) -> str:
+        templates = self._templates.get(lang) or self._templates[self.default_lang]
+        template = templates.get(key)
+        if template is None:
+            return key
+        return template.render(kwargs)
+
+    def variants(self, key: str) -> Tuple[str, ...]:
+        return tuple(templates[key].text for templates in self._templates.values() if key in templates)
+
+
+def load_catalogs(directory: Path = LOCALES_DIR) -> Dict[str, Dict[str, str]]:
+    catalogs: Dict[str, Dict[str, str]] = {}
+    if not directory.is_dir():
+        return catalogs
+    for path in sorted(directory.glob("*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if not isinstance(data, dict) or not all(isinstance(value, str) for value in data.values()):
+            raise RuntimeError(f"Invalid i18n catalog: {path}")
+        catalogs[path.stem] = data
+    return catalogs
+
+
+def build_catalog(builtin: Mapping[str, Mapping[str, str]], default_lang: str, directory: Path = LOCALES_DIR) -> Catalog:
+    catalogs = {lang: dict(values) for lang, values in builtin.items()}
+    for lang, values in load_catalogs(directory).items():
+        catalogs[lang] = {**catalogs.get(lang, {}), **values}
+    return Catalog(catalogs, default_lang)
@@ -1,4 +1,5 @@
-from typing import Any, Iterable, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar
 
 from aiogram.types import InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -13,6 +14,7 @@ BTN_ADMINS = "Adminlar"
 BTN_MENUS = "Menyular"
 BTN_BACK = "Orqaga"
 BTN_EXIT = "Paneldan chiqish"
+BTN_BROADCAST = "Xabar yuborish"
 
 BTN_CHANNEL_ADD = "Kanal qo'shish"
 BTN_CHANNEL_REMOVE = "Kanal o'chirish"
@@ -39,6 +41,22 @@ BTN_CUSTOM_MENU_LIST = "Menyular ro'yxati"
 BTN_PROFILE = "Profil"
 BTN_DELETE_DATA = "Ma'lumotlarni o'chirish"
 
+M = TypeVar("M")
+
+
+class MarkupCache:
+    def __init__(self, max_entries: int = 64) -> None:
+        self.max_entries = max_entries
+        self._markups: Dict[Hashable, Any] = {}
+
+    def get(self, key: Hashable, build: Callable[[], M]) -> M:
+        markup = self._markups.get(key)
+        if markup is None:
+            if len(self._markups) >= self.max_entries:
+                self._markups.clear()
+            markup = self._markups[key] = build()
+        return markup
+
 
 def _derive_channel_url(chat_ref: str) -> Optional[str]:
     if chat_ref.startswith("@"):
@@ -71,11 +89,11 @@ def subscription_keyboard_with_text(
     return builder.as_markup()
 
 
-def language_select_keyboard() -> InlineKeyboardMarkup:
+@lru_cache(maxsize=None)
+def language_select_keyboard(languages: Tuple[Tuple[str, str], ...]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    builder.button(text="Lotin", callback_data="user:lang:lotin")
-    builder.button(text="Kril", callback_data="user:lang:kril")
-    builder.button(text="Russ", callback_data="user:lang:russ")
+    for lang, label in languages:
+        builder.button(text=label, callback_data=f"user:lang:{lang}")
     builder.adjust(3)
     return builder.as_markup()
 
@@ -88,18 +106,20 @@ def payment_review_keyboard(payment_id: int) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def admin_main_menu_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text=BTN_STATS), KeyboardButton(text=BTN_CHANNELS)],
             [KeyboardButton(text=BTN_CARDS), KeyboardButton(text=BTN_SETTINGS)],
             [KeyboardButton(text=BTN_MENUS), KeyboardButton(text=BTN_ADMINS)],
-            [KeyboardButton(text=BTN_EXIT)],
+            [KeyboardButton(text=BTN_BROADCAST), KeyboardButton(text=BTN_EXIT)],
         ],
         resize_keyboard=True,
     )
 
 
+@lru_cache(maxsize=None)
 def admin_entry_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=ADMIN_PANEL_TEXT)]],
@@ -122,6 +142,7 @@ def user_main_menu_keyboard(
     )
 
 
+@lru_cache(maxsize=None)
 def profile_actions_keyboard(
     edit_first_name_text: str,
     edit_last_name_text: str,
@@ -139,6 +160,7 @@ def profile_actions_keyboard(
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def admin_channels_menu_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -149,6 +171,7 @@ def admin_channels_menu_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def admin_cards_menu_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -160,6 +183,7 @@ def admin_cards_menu_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def admin_settings_menu_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -171,6 +195,7 @@ def admin_settings_menu_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def admin_admins_menu_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -181,6 +206,7 @@ def admin_admins_menu_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def admin_custom_menus_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -191,10 +217,12 @@ def admin_custom_menus_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def remove_reply_keyboard() -> ReplyKeyboardRemove:
     return ReplyKeyboardRemove()
 
 
+@lru_cache(maxsize=None)
 def phone_request_keyboard(button_text: str = "Telefon raqam yuborish") -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=button_text, request_contact=True)]],
@@ -2,18 +2,24 @@ import asyncio
 import html
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ChatMemberStatus, ParseMode
+from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, Message
+from aiogram.methods import CopyMessage, SendDocument, SendMessage, SendPhoto, TelegramMethod
+from aiogram.types import CallbackQuery, ChatMemberUpdated, Message, ReplyParameters
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
+from broadcast import Broadcaster
 from config import Config, load_config
-from database import Database
+from database import AsyncDatabase, Database
+from fsm_storage import SQLiteStorage
+from i18n import build_catalog
 from keyboards import (
     ADMIN_PANEL_TEXT,
     BTN_ADMIN_ADD,
@@ -21,6 +27,7 @@ from keyboards import (
     BTN_ADMIN_REMOVE,
     BTN_ADMINS,
     BTN_BACK,
+    BTN_BROADCAST,
     BTN_CARD_ACTIVATE,
     BTN_CARD_ADD,
     BTN_CARD_LIST,
@@ -41,6 +48,7 @@ from keyboards import (
     BTN_SETTING_THRESHOLD,
     BTN_SETTINGS,
     BTN_STATS,
+    MarkupCache,
     admin_admins_menu_keyboard,
     admin_cards_menu_keyboard,
     admin_channels_menu_keyboard,
@@ -56,14 +64,28 @@ from keyboards import (
     subscription_keyboard_with_text,
     user_main_menu_keyboard,
 )
+from membership import CHANNEL_MEMBERS_MAX_AGE, MembershipCache, SubscriptionChecker
+from middlewares import (
+    ConcurrencyLimitMiddleware,
+    RoleMiddleware,
+    ThrottleMiddleware,
+    UserContext,
+    UserContextMiddleware,
+)
+from outbox import Outbox
+from ratelimit import RateLimitMiddleware
+from routing import ButtonRouter
+from scheduler import DailyAt, Scheduler
+from sharding import OUTBOX_POLL_INTERVAL, ShardRouter, WorkerPool, consume_updates, sync_caches
 from states import AdminStates, UserStates
 
 UZ_TZ = timezone(timedelta(hours=5))
-SUPPORTED_LANGS = {"lotin", "kril", "russ"}
+OUTBOX_FAILED_RETENTION = timedelta(days=30)
 DEFAULT_LANG = "lotin"
 
 I18N: Dict[str, Dict[str, str]] = {
     "lotin": {
+        "lang_button": "Lotin",
         "lang_prompt": "Tilni tanlang:",
         "lang_saved": "Til saqlandi.",
         "sub_required": "Botdan foydalanish uchun avval majburiy obunalardan o'ting.",
@@ -113,6 +135,7 @@ I18N: Dict[str, Dict[str, str]] = {
         "profile_deleted": "Ma'lumotlaringiz bazadan butunlay o'chirildi.\n/start ni bosing.",
     },
     "kril": {
+        "lang_button": "Kril",
         "lang_prompt": "\u0422\u0438\u043b\u043d\u0438 \u0442\u0430\u043d\u043b\u0430\u043d\u0433:",
         "lang_saved": "\u0422\u0438\u043b \u0441\u0430\u049b\u043b\u0430\u043d\u0434\u0438.",
         "sub_required": "\u0411\u043e\u0442\u0434\u0430\u043d \u0444\u043e\u0439\u0434\u0430\u043b\u0430\u043d\u0438\u0448 \u0443\u0447\u0443\u043d \u0430\u0432\u0432\u0430\u043b \u043c\u0430\u0436\u0431\u0443\u0440\u0438\u0439 \u043e\u0431\u0443\u043d\u0430\u043b\u0430\u0440\u0434\u0430\u043d \u045e\u0442\u0438\u043d\u0433.",
@@ -162,6 +185,7 @@ I18N: Dict[str, Dict[str, str]] = {
         "profile_deleted": "\u041c\u0430\u044a\u043b\u0443\u043c\u043e\u0442\u043b\u0430\u0440\u0438\u043d\u0433\u0438\u0437 \u0431\u0430\u0437\u0430\u0434\u0430\u043d \u0431\u0443\u0442\u0443\u043d\u043b\u0430\u0439 \u045e\u0447\u0438\u0440\u0438\u043b\u0434\u0438.\n/start \u043d\u0438 \u0431\u043e\u0441\u0438\u043d\u0433.",
     },
     "russ": {
+        "lang_button": "Russ",
         "lang_prompt": "\u0412\u044b\u0431\u0435\u0440\u0438\u0442\u0435 \u044f\u0437\u044b\u043a:",
         "lang_saved": "\u042f\u0437\u044b\u043a \u0441\u043e\u0445\u0440\u0430\u043d\u0435\u043d.",
         "sub_required": "\u0427\u0442\u043e\u0431\u044b \u043f\u043e\u043b\u044c\u0437\u043e\u0432\u0430\u0442\u044c\u0441\u044f \u0431\u043e\u0442\u043e\u043c, \u0441\u043d\u0430\u0447\u0430\u043b\u0430 \u0432\u044b\u043f\u043e\u043b\u043d\u0438\u0442\u0435 \u043e\u0431\u044f\u0437\u0430\u0442\u0435\u043b\u044c\u043d\u044b\u0435 \u043f\u043e\u0434\u043f\u0438\u0441\u043a\u0438.",
@@ -212,6 +236,10 @@ I18N: Dict[str, Dict[str, str]] = {
     },
 }
 
+CATALOG = build_catalog(I18N, DEFAULT_LANG)
+SUPPORTED_LANGS = frozenset(CATALOG.languages)
+LANGUAGE_BUTTONS = tuple((lang, CATALOG.labels[lang]) for lang in CATALOG.languages)
+
 
 def h(value: object) -> str:
     return html.escape(str(value), quote=False)
@@ -228,55 +256,63 @@ def normalize_lang(language: str) -> str:
     return language if language in SUPPORTED_LANGS else DEFAULT_LANG
 
 
-def user_lang(db: Database, user_id: int) -> str:
-    return normalize_lang(db.get_user_language(user_id))
+async def user_lang(db: AsyncDatabase, user_id: int) -> str:
+    return normalize_lang(await db.get_user_language(user_id))
 
 
-def t(db: Database, user_id: int, key: str, **kwargs: object) -> str:
-    lang = user_lang(db, user_id)
-    base = I18N.get(lang, I18N[DEFAULT_LANG])
-    template = base.get(key) or I18N[DEFAULT_LANG].get(key) or key
-    return template.format(**kwargs)
+def t(lang: str, key: str, **kwargs: object) -> str:
+    return CATALOG.text(lang, key, **kwargs)
 
 
-PROFILE_BUTTON_TEXTS = {
-    str(values.get("menu_profile_btn", "")).strip().casefold()
-    for values in I18N.values()
-    if str(values.get("menu_profile_btn", "")).strip()
-}
-DELETE_BUTTON_TEXTS = {
-    str(values.get("menu_delete_btn", "")).strip().casefold()
-    for values in I18N.values()
-    if str(values.get("menu_delete_btn", "")).strip()
-}
+PROFILE_BUTTON_TEXTS = {text.strip().casefold() for text in CATALOG.variants("menu_profile_btn") if text.strip()}
+DELETE_BUTTON_TEXTS = {text.strip().casefold() for text in CATALOG.variants("menu_delete_btn") if text.strip()}
 
 
-def user_menu_keyboard(db: Database, user_id: int):
-    extra_buttons = [str(row["button_text"]) for row in db.list_custom_menus()]
-    return user_main_menu_keyboard(
-        t(db, user_id, "menu_profile_btn"),
-        t(db, user_id, "menu_delete_btn"),
-        extra_buttons=extra_buttons,
+USER_MENU_KEYBOARDS = MarkupCache()
+SUBSCRIPTION_KEYBOARDS = MarkupCache()
+
+
+async def user_menu_keyboard(db: AsyncDatabase, lang: str):
+    version, buttons = await db.custom_menu_buttons()
+    return USER_MENU_KEYBOARDS.get(
+        (lang, version),
+        lambda: user_main_menu_keyboard(
+            t(lang, "menu_profile_btn"),
+            t(lang, "menu_delete_btn"),
+            extra_buttons=list(buttons),
+        ),
     )
 
 
-def user_profile_keyboard(db: Database, user_id: int):
+async def subscription_prompt_keyboard(db: AsyncDatabase, lang: str):
+    channel_list = await db.channel_list()
+    instagram_url = await db.get_setting("instagram_url", "")
+    return SUBSCRIPTION_KEYBOARDS.get(
+        (lang, channel_list.version, instagram_url),
+        lambda: subscription_keyboard_with_text(
+            channel_list.channels,
+            instagram_url,
+            t(lang, "sub_check_btn"),
+        ),
+    )
+
+
+def user_profile_keyboard(lang: str):
     return profile_actions_keyboard(
-        t(db, user_id, "profile_edit_first_btn"),
-        t(db, user_id, "profile_edit_last_btn"),
-        t(db, user_id, "profile_edit_phone_btn"),
-        t(db, user_id, "profile_edit_birth_btn"),
-        t(db, user_id, "profile_close_btn"),
+        t(lang, "profile_edit_first_btn"),
+        t(lang, "profile_edit_last_btn"),
+        t(lang, "profile_edit_phone_btn"),
+        t(lang, "profile_edit_birth_btn"),
+        t(lang, "profile_close_btn"),
     )
 
 
-def format_profile_text(db: Database, user_id: int) -> str:
-    profile = db.get_user_profile(user_id)
+async def format_profile_text(db: AsyncDatabase, lang: str, user_id: int) -> str:
+    profile = await db.get_user_profile(user_id)
     if not profile:
-        return t(db, user_id, "profile_not_found")
+        return t(lang, "profile_not_found")
     return t(
-        db,
-        user_id,
+        lang,
         "profile_text",
         first_name=h(profile["first_name"] or "-"),
         last_name=h(profile["last_name"] or "-"),
@@ -285,14 +321,13 @@ def format_profile_text(db: Database, user_id: int) -> str:
     )
 
 
-def format_payment_text(db: Database, user_id: int) -> str:
-    card = db.get_active_card()
+async def format_payment_text(db: AsyncDatabase, lang: str) -> str:
+    card = await db.get_active_card()
     if not card:
-        return t(db, user_id, "card_not_set")
+        return t(lang, "card_not_set")
 
     return t(
-        db,
-        user_id,
+        lang,
         "payment_prompt",
         owner=h(card["owner_name"]),
         card=h(card["card_number"]),
@@ -345,10 +380,10 @@ def format_custom_menus_text(menus: List[object]) -> str:
     return "\n\n".join(lines)
 
 
-def format_settings_text(db: Database) -> str:
-    instagram_url = db.get_setting("instagram_url", "")
-    suspicious_threshold = db.get_int_setting("suspicious_threshold", 3)
-    inbox_chat_id = db.get_setting("inbox_chat_id", "")
+async def format_settings_text(db: AsyncDatabase) -> str:
+    instagram_url = await db.get_setting("instagram_url", "")
+    suspicious_threshold = await db.get_int_setting("suspicious_threshold", 3)
+    inbox_chat_id = await db.get_setting("inbox_chat_id", "")
     instagram_text = instagram_url if instagram_url else "(kiritilmagan)"
     inbox_text = inbox_chat_id if inbox_chat_id else "(kiritilmagan)"
     return (
@@ -399,19 +434,6 @@ def parse_birth_date(value: str) -> Optional[str]:
     return parsed.strftime("%Y-%m-%d")
 
 
-async def get_missing_channels(bot: Bot, user_id: int, channels: List[object]) -> List[str]:
-    missing: List[str] = []
-    for row in channels:
-        chat_ref = str(row["chat_ref"])
-        try:
-            member = await bot.get_chat_member(chat_id=chat_ref, user_id=user_id)
-            if member.status in {ChatMemberStatus.LEFT, ChatMemberStatus.KICKED}:
-                missing.append(chat_ref)
-        except TelegramBadRequest:
-            missing.append(chat_ref)
-    return missing
-
-
 def extract_receipt(message: Message) -> Optional[Tuple[str, str]]:
     if message.photo:
         return ("photo", message.photo[-1].file_id)
@@ -420,27 +442,20 @@ def extract_receipt(message: Message) -> Optional[Tuple[str, str]]:
     return None
 
 
-async def send_subscription_prompt(message: Message, db: Database, missing: List[str]) -> None:
-    channels = db.list_channels()
-    instagram_url = db.get_setting("instagram_url", "")
-    lang_user_id = message.from_user.id if message.from_user else 0
+async def send_subscription_prompt(message: Message, db: AsyncDatabase, missing: List[str], lang: str) -> None:
     missing_text = ", ".join(missing) if missing else "barchasi"
     text = (
-        f"{t(db, lang_user_id, 'sub_required')}\n"
-        f"{t(db, lang_user_id, 'sub_missing', channels=h(missing_text))}\n\n"
-        f"{t(db, lang_user_id, 'sub_check_btn')}"
+        f"{t(lang, 'sub_required')}\n"
+        f"{t(lang, 'sub_missing', channels=h(missing_text))}\n\n"
+        f"{t(lang, 'sub_check_btn')}"
     )
     await message.answer(
         text,
-        reply_markup=subscription_keyboard_with_text(
-            channels,
-            instagram_url,
-            t(db, lang_user_id, "sub_check_btn"),
-        ),
+        reply_markup=await subscription_prompt_keyboard(db, lang),
     )
 
 
-async def send_payment_to_admins(bot: Bot, db: Database, message: Message, payment_id: int) -> None:
+async def send_payment_to_admins(outbox: Outbox, db: AsyncDatabase, message: Message, payment_id: int) -> None:
     username = f"@{message.from_user.username}" if message.from_user and message.from_user.username else "(yo'q)"
     admin_caption = (
         f"Yangi to'lov cheki\n\n"
@@ -455,29 +470,30 @@ async def send_payment_to_admins(bot: Bot, db: Database, message: Message, payme
         return
 
     receipt_type, file_id = receipt
-    for admin_id in db.list_admins():
-        try:
-            if receipt_type == "photo":
-                await bot.send_photo(
-                    admin_id,
+    methods: List[TelegramMethod] = []
+    for admin_id in await db.list_admins():
+        if receipt_type == "photo":
+            methods.append(
+                SendPhoto(
+                    chat_id=admin_id,
                     photo=file_id,
                     caption=admin_caption,
                     reply_markup=payment_review_keyboard(payment_id),
                 )
-            else:
-                await bot.send_document(
-                    admin_id,
+            )
+        else:
+            methods.append(
+                SendDocument(
+                    chat_id=admin_id,
                     document=file_id,
                     caption=admin_caption,
                     reply_markup=payment_review_keyboard(payment_id),
                 )
-        except TelegramForbiddenError:
-            continue
-        except TelegramBadRequest:
-            continue
+            )
+    await outbox.enqueue(methods)
 
 
-async def alert_suspicious_attempt(bot: Bot, db: Database, message: Message, attempts: int) -> None:
+async def alert_suspicious_attempt(outbox: Outbox, db: AsyncDatabase, message: Message, attempts: int) -> None:
     username = f"@{message.from_user.username}" if message.from_user and message.from_user.username else "(yo'q)"
     alert_text = (
         "Shubhali holat kuzatildi.\n\n"
@@ -486,64 +502,59 @@ async def alert_suspicious_attempt(bot: Bot, db: Database, message: Message, att
         f"Username: {h(username)}\n"
         f"To'lovsiz urinishlar: {attempts}"
     )
-    for admin_id in db.list_admins():
-        try:
-            await bot.send_message(admin_id, alert_text)
-        except TelegramForbiddenError:
-            continue
-        except TelegramBadRequest:
-            continue
-
-
-async def send_ready_or_payment_message(bot: Bot, db: Database, chat_id: int, user_id: int) -> None:
-    channels = db.list_channels()
-    missing = await get_missing_channels(bot, user_id, channels)
+    await outbox.enqueue(SendMessage(chat_id=admin_id, text=alert_text) for admin_id in await db.list_admins())
+
+
+async def send_ready_or_payment_message(
+    bot: Bot,
+    db: AsyncDatabase,
+    subscriptions: SubscriptionChecker,
+    chat_id: int,
+    user_ctx: UserContext,
+    lang: str,
+) -> None:
+    channels = await db.list_channels()
+    missing = await subscriptions.missing_channels(bot, user_ctx.user_id, channels)
     if missing:
-        instagram_url = db.get_setting("instagram_url", "")
         text = (
-            f"{t(db, user_id, 'sub_required')}\n"
-            f"{t(db, user_id, 'sub_missing', channels=h(', '.join(missing)))}"
+            f"{t(lang, 'sub_required')}\n"
+            f"{t(lang, 'sub_missing', channels=h(', '.join(missing)))}"
         )
         await bot.send_message(
             chat_id,
             text,
-            reply_markup=subscription_keyboard_with_text(
-                channels, instagram_url, t(db, user_id, "sub_check_btn")
-            ),
+            reply_markup=await subscription_prompt_keyboard(db, lang),
         )
         return
 
-    if not db.is_user_registered(user_id):
-        await bot.send_message(chat_id, t(db, user_id, "must_register"))
+    if not user_ctx.is_registered:
+        await bot.send_message(chat_id, t(lang, "must_register"))
         return
 
-    credits = db.get_credits(user_id)
-    if credits > 0:
+    if user_ctx.credits > 0:
         await bot.send_message(
             chat_id,
-            t(db, user_id, "ready_with_credits", credits=credits),
-            reply_markup=user_menu_keyboard(db, user_id),
+            t(lang, "ready_with_credits", credits=user_ctx.credits),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         return
 
-    pending = db.get_pending_payment(user_id)
-    if pending:
+    if user_ctx.pending_payment_id is not None:
         await bot.send_message(
             chat_id,
-            t(db, user_id, "receipt_pending"),
-            reply_markup=user_menu_keyboard(db, user_id),
+            t(lang, "receipt_pending"),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         return
 
     await bot.send_message(
         chat_id,
-        format_payment_text(db, user_id),
-        reply_markup=user_menu_keyboard(db, user_id),
+        await format_payment_text(db, lang),
+        reply_markup=await user_menu_keyboard(db, lang),
     )
 
 
-async def forward_user_message_to_admins(bot: Bot, db: Database, message: Message) -> int:
-    sent_count = 0
+async def forward_user_message_to_admins(outbox: Outbox, db: AsyncDatabase, message: Message) -> int:
     username = f"@{message.from_user.username}" if message.from_user and message.from_user.username else "(yo'q)"
     head = (
         "Yangi user xabari.\n"
@@ -553,269 +564,311 @@ async def forward_user_message_to_admins(bot: Bot, db: Database, message: Messag
         "Yangi xabar:"
     )
 
-    inbox_chat_id = db.get_setting("inbox_chat_id", "").strip()
+    inbox_chat_id = (await db.get_setting("inbox_chat_id", "")).strip()
     if inbox_chat_id:
-        try:
-            target_chat: object = int(inbox_chat_id) if inbox_chat_id.lstrip("-").isdigit() else inbox_chat_id
-            await bot.send_message(target_chat, head)
-            await bot.copy_message(
-                chat_id=target_chat,
-                from_chat_id=message.chat.id,
-                message_id=message.message_id,
-            )
-            return 1
-        except TelegramBadRequest:
-            return 0
-        except TelegramForbiddenError:
-            return 0
+        target_chat: Union[int, str] = int(inbox_chat_id) if inbox_chat_id.lstrip("-").isdigit() else inbox_chat_id
+        targets: List[Union[int, str]] = [target_chat]
+    else:
+        targets = list(await db.list_admins())
 
-    for admin_id in db.list_admins():
-        try:
-            await bot.send_message(admin_id, head)
-            await bot.copy_message(
-                chat_id=admin_id,
-                from_chat_id=message.chat.id,
-                message_id=message.message_id,
-            )
-            sent_count += 1
-        except TelegramForbiddenError:
-            continue
-        except TelegramBadRequest:
-            continue
-    return sent_count
+    methods: List[TelegramMethod] = []
+    for chat_id in targets:
+        methods.append(SendMessage(chat_id=chat_id, text=head))
+        methods.append(CopyMessage(chat_id=chat_id, from_chat_id=message.chat.id, message_id=message.message_id))
+    await outbox.enqueue(methods, link=(message.from_user.id, message.message_id), refund=True)
+    return len(targets)
 
 
-async def process_today_birthdays(bot: Bot, db: Database) -> None:
-    now = datetime.now(UZ_TZ)
-    month_day = now.strftime("%m-%d")
-    year = now.year
-    birthday_users = db.list_today_birthdays(month_day)
-    if not birthday_users:
-        return
+BIRTHDAY_DIGEST_LIMIT = 4000
+BIRTHDAY_TEMPLATE = "Shablon: Bugun tug'ilgan kuningiz ekan, sizga 25% chegirma."
 
-    for row in birthday_users:
-        user_tg_id = int(row["tg_id"])
-        if db.is_birthday_notified(user_tg_id, year):
-            continue
 
-        first_name = row["first_name"] or ""
-        last_name = row["last_name"] or ""
-        phone = row["phone"] or "-"
-        birth_date = row["birth_date"] or "-"
-        username = f"@{row['username']}" if row["username"] else "(yo'q)"
-        text = (
-            "Bugun foydalanuvchi tug'ilgan kuni.\n\n"
-            f"User ID: <code>{user_tg_id}</code>\n"
-            f"Ism: {h(first_name)}\n"
-            f"Familiya: {h(last_name)}\n"
-            f"Telefon: <code>{h(phone)}</code>\n"
-            f"Sana: <code>{h(birth_date)}</code>\n"
-            f"Username: {h(username)}\n\n"
-            "Shablon: Bugun tug'ilgan kuningiz ekan, sizga 25% chegirma."
-        )
+def format_birthday_entry(row: Any) -> str:
+    username = f"@{row['username']}" if row["username"] else "(yo'q)"
+    return (
+        f"User ID: <code>{int(row['tg_id'])}</code>\n"
+        f"Ism: {h(row['first_name'] or '')}\n"
+        f"Familiya: {h(row['last_name'] or '')}\n"
+        f"Telefon: <code>{h(row['phone'] or '-')}</code>\n"
+        f"Sana: <code>{h(row['birth_date'] or '-')}</code>\n"
+        f"Username: {h(username)}"
+    )
 
-        delivered = False
-        for admin_id in db.list_admins():
-            try:
-                await bot.send_message(admin_id, text)
-                delivered = True
-            except TelegramForbiddenError:
-                continue
-            except TelegramBadRequest:
-                continue
 
-        if delivered:
-            db.mark_birthday_notified(user_tg_id, year)
+def birthday_digest_messages(rows: List[Any]) -> List[str]:
+    messages: List[str] = []
+    current = f"Bugun tug'ilgan kunlar: {len(rows)} ta foydalanuvchi."
+    for entry in [format_birthday_entry(row) for row in rows] + [BIRTHDAY_TEMPLATE]:
+        if len(current) + len(entry) + 2 > BIRTHDAY_DIGEST_LIMIT:
+            messages.append(current)
+            current = entry
+        else:
+            current = f"{current}\n\n{entry}"
+    messages.append(current)
+    return messages
+
+
+async def process_today_birthdays(outbox: Outbox, db: AsyncDatabase, now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(UZ_TZ)
+    rows = await db.list_unnotified_birthdays(now.strftime("%m-%d"), now.year)
+    if not rows:
+        return 0
+
+    messages = birthday_digest_messages(rows)
+    admin_ids = await db.list_admins()
+    items = outbox.prepare(SendMessage(chat_id=admin_id, text=text) for admin_id in admin_ids for text in messages)
+    if items:
+        await db.enqueue_birthday_digest(items, [int(row["tg_id"]) for row in rows], now.year)
+        outbox.wake()
+    return len(rows)
+
+
+def register_jobs(scheduler: Scheduler, db: AsyncDatabase, outbox: Outbox, config: Config) -> None:
+    @scheduler.every("birthdays", DailyAt(config.birthday_notify_hour, tz=UZ_TZ))
+    async def birthdays_job(payload: Dict[str, Any]) -> None:
+        await process_today_birthdays(outbox, db)
+
+    @scheduler.every("retention_cleanup", DailyAt(4, tz=UZ_TZ))
+    async def retention_cleanup_job(payload: Dict[str, Any]) -> None:
+        now = datetime.now(timezone.utc)
+        await db.prune_channel_members((now - CHANNEL_MEMBERS_MAX_AGE).isoformat(timespec="seconds"))
+        await db.purge_failed_outbox((now - OUTBOX_FAILED_RETENTION).isoformat(timespec="seconds"))
+
+
+def register_handlers(
+    dp: Dispatcher,
+    db: AsyncDatabase,
+    config: Config,
+    outbox: Outbox,
+    broadcaster: Broadcaster,
+) -> None:
+    subscriptions = SubscriptionChecker(
+        db,
+        MembershipCache(config.subscription_ttl_seconds, config.subscription_negative_ttl_seconds),
+        config.subscription_check_mode,
+    )
 
+    @dp.startup()
+    async def resume_broadcasts(bot: Bot) -> None:
+        await broadcaster.resume(bot)
 
-async def birthday_notifier_loop(bot: Bot, db: Database) -> None:
-    while True:
-        try:
-            await process_today_birthdays(bot, db)
-        except Exception:
-            logging.exception("Birthday notifier error")
-        await asyncio.sleep(3600)
+    @dp.shutdown()
+    async def stop_broadcasts() -> None:
+        await broadcaster.stop()
+
+    async def notify_refund(user_tg_id: int) -> None:
+        lang = await user_lang(db, user_tg_id)
+        await outbox.enqueue([SendMessage(chat_id=user_tg_id, text=t(lang, "admin_send_failed"))])
+
+    outbox.on_refund = notify_refund
+
+    dp.update.outer_middleware(RoleMiddleware(db))
+    dp.message.middleware(UserContextMiddleware(db))
+    dp.callback_query.middleware(UserContextMiddleware(db))
 
+    if subscriptions.mode == "events":
+
+        @dp.startup()
+        async def reconcile_channel_members(bot: Bot) -> None:
+            await subscriptions.reconcile(bot)
+
+        @dp.my_chat_member()
+        async def channel_bot_status_update(event: ChatMemberUpdated) -> None:
+            await subscriptions.record_bot_status(event.chat, event.new_chat_member.status)
+
+        @dp.chat_member()
+        async def channel_member_update(event: ChatMemberUpdated) -> None:
+            await subscriptions.record_member(
+                event.chat,
+                event.new_chat_member.user.id,
+                event.new_chat_member.status,
+            )
 
-def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
     @dp.message(CommandStart())
-    async def start_handler(message: Message, state: FSMContext) -> None:
+    async def start_handler(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        db.upsert_user(
+        await db.upsert_user(
             tg_id=message.from_user.id,
             username=message.from_user.username,
             full_name=user_display_name(message),
         )
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             await state.clear()
             await message.answer("Admin panel tugmasi pastda.", reply_markup=admin_entry_keyboard())
             return
 
-        channels = db.list_channels()
-        missing = await get_missing_channels(message.bot, message.from_user.id, channels)
+        channels = await db.list_channels()
+        missing = await subscriptions.missing_channels(message.bot, message.from_user.id, channels)
         if missing:
-            await send_subscription_prompt(message, db, missing)
+            await send_subscription_prompt(message, db, missing, normalize_lang(user_ctx.language))
             return
 
-        if not db.get_user_language(message.from_user.id):
+        language = user_ctx.language
+        lang = normalize_lang(language)
+        if not language:
             await state.clear()
             await message.answer(
-                t(db, message.from_user.id, "lang_prompt"),
-                reply_markup=language_select_keyboard(),
+                t(lang, "lang_prompt"),
+                reply_markup=language_select_keyboard(LANGUAGE_BUTTONS),
             )
             return
 
-        if not db.is_user_registered(message.from_user.id):
+        if not user_ctx.is_registered:
             await state.clear()
             await state.set_state(UserStates.waiting_first_name)
-            await message.answer(t(db, message.from_user.id, "reg_start"))
+            await message.answer(t(lang, "reg_start"))
             return
 
-        await send_ready_or_payment_message(message.bot, db, message.chat.id, message.from_user.id)
+        await send_ready_or_payment_message(message.bot, db, subscriptions, message.chat.id, user_ctx, lang)
 
     @dp.callback_query(F.data == "user:check_subs")
-    async def check_subscriptions_handler(callback: CallbackQuery, state: FSMContext) -> None:
+    async def check_subscriptions_handler(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext) -> None:
         if not callback.from_user:
             return
         user_id = callback.from_user.id
-        channels = db.list_channels()
-        missing = await get_missing_channels(callback.bot, user_id, channels)
+        language = user_ctx.language
+        lang = normalize_lang(language)
+        channels = await db.list_channels()
+        missing = await subscriptions.missing_channels(callback.bot, user_id, channels, force=True)
         if missing:
-            instagram_url = db.get_setting("instagram_url", "")
             text = (
-                f"{t(db, user_id, 'sub_required')}\n"
-                f"{t(db, user_id, 'sub_missing', channels=h(', '.join(missing)))}"
+                f"{t(lang, 'sub_required')}\n"
+                f"{t(lang, 'sub_missing', channels=h(', '.join(missing)))}"
             )
             if callback.message:
                 await callback.message.answer(
                     text,
-                    reply_markup=subscription_keyboard_with_text(
-                        channels,
-                        instagram_url,
-                        t(db, user_id, "sub_check_btn"),
-                    ),
+                    reply_markup=await subscription_prompt_keyboard(db, lang),
                 )
-            await callback.answer(t(db, user_id, "sub_not_full"), show_alert=True)
+            await callback.answer(t(lang, "sub_not_full"), show_alert=True)
             return
 
-        await callback.answer(t(db, user_id, "sub_ok"))
+        await callback.answer(t(lang, "sub_ok"))
         if callback.message:
-            if not db.get_user_language(user_id):
+            if not language:
                 await state.clear()
                 await callback.message.answer(
-                    t(db, user_id, "lang_prompt"),
-                    reply_markup=language_select_keyboard(),
+                    t(lang, "lang_prompt"),
+                    reply_markup=language_select_keyboard(LANGUAGE_BUTTONS),
                 )
                 return
-            if not db.is_user_registered(user_id):
+            if not user_ctx.is_registered:
                 await state.clear()
                 await state.set_state(UserStates.waiting_first_name)
-                await callback.message.answer(t(db, user_id, "reg_start"))
+                await callback.message.answer(t(lang, "reg_start"))
                 return
             await send_ready_or_payment_message(
                 callback.bot,
                 db,
+                subscriptions,
                 callback.message.chat.id,
-                user_id,
+                user_ctx,
+                lang,
             )
 
     @dp.callback_query(F.data.startswith("user:lang:"))
-    async def language_select_handler(callback: CallbackQuery, state: FSMContext) -> None:
+    async def language_select_handler(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext) -> None:
         if not callback.from_user:
             return
         lang = (callback.data or "").split(":")[-1]
         if lang not in SUPPORTED_LANGS:
             await callback.answer("Xato til", show_alert=True)
             return
-        db.set_user_language(callback.from_user.id, lang)
-        await callback.answer(t(db, callback.from_user.id, "lang_saved"))
+        await db.set_user_language(callback.from_user.id, lang)
+        await callback.answer(t(lang, "lang_saved"))
         if callback.message:
             try:
                 await callback.message.edit_reply_markup(reply_markup=None)
             except TelegramBadRequest:
                 pass
 
-            if not db.is_user_registered(callback.from_user.id):
+            if not user_ctx.is_registered:
                 await state.clear()
                 await state.set_state(UserStates.waiting_first_name)
-                await callback.message.answer(t(db, callback.from_user.id, "reg_start"))
+                await callback.message.answer(t(lang, "reg_start"))
             else:
                 await send_ready_or_payment_message(
                     callback.bot,
                     db,
+                    subscriptions,
                     callback.message.chat.id,
-                    callback.from_user.id,
+                    user_ctx,
+                    lang,
                 )
 
     @dp.message(UserStates.waiting_first_name)
-    async def user_first_name_state(message: Message, state: FSMContext) -> None:
+    async def user_first_name_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
         value = (message.text or "").strip()
         if len(value) < 2:
-            await message.answer(t(db, message.from_user.id, "reg_first_invalid"))
+            await message.answer(t(lang, "reg_first_invalid"))
             return
         await state.update_data(first_name=value)
         await state.set_state(UserStates.waiting_last_name)
-        await message.answer(t(db, message.from_user.id, "reg_last_prompt"))
+        await message.answer(t(lang, "reg_last_prompt"))
 
     @dp.message(UserStates.waiting_last_name)
-    async def user_last_name_state(message: Message, state: FSMContext) -> None:
+    async def user_last_name_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
         value = (message.text or "").strip()
         if len(value) < 2:
-            await message.answer(t(db, message.from_user.id, "reg_last_invalid"))
+            await message.answer(t(lang, "reg_last_invalid"))
             return
         await state.update_data(last_name=value)
         await state.set_state(UserStates.waiting_phone)
         await message.answer(
-            t(db, message.from_user.id, "reg_phone_prompt"),
-            reply_markup=phone_request_keyboard(t(db, message.from_user.id, "reg_phone_button")),
+            t(lang, "reg_phone_prompt"),
+            reply_markup=phone_request_keyboard(t(lang, "reg_phone_button")),
         )
 
     @dp.message(UserStates.waiting_phone)
-    async def user_phone_state(message: Message, state: FSMContext) -> None:
+    async def user_phone_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
 
         phone_value: Optional[str] = None
         if message.contact:
             if message.contact.user_id and message.contact.user_id != message.from_user.id:
-                await message.answer(t(db, message.from_user.id, "reg_phone_self_only"))
+                await message.answer(t(lang, "reg_phone_self_only"))
                 return
             phone_value = normalize_phone(message.contact.phone_number or "")
         else:
             phone_value = normalize_phone(message.text or "")
 
         if not phone_value:
-            await message.answer(t(db, message.from_user.id, "reg_phone_invalid"))
+            await message.answer(t(lang, "reg_phone_invalid"))
             return
 
         await state.update_data(phone=phone_value)
         await state.set_state(UserStates.waiting_birth_date)
         await message.answer(
-            t(db, message.from_user.id, "reg_birth_prompt"),
+            t(lang, "reg_birth_prompt"),
             reply_markup=remove_reply_keyboard(),
         )
 
     @dp.message(UserStates.waiting_birth_date)
-    async def user_birth_date_state(message: Message, state: FSMContext) -> None:
+    async def user_birth_date_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
 
         birth_date = parse_birth_date(message.text or "")
         if not birth_date:
-            await message.answer(t(db, message.from_user.id, "reg_birth_invalid"))
+            await message.answer(t(lang, "reg_birth_invalid"))
             return
 
         data = await state.get_data()
@@ -824,10 +877,10 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
         phone = str(data.get("phone", "")).strip()
         if not first_name or not last_name or not phone:
             await state.clear()
-            await message.answer(t(db, message.from_user.id, "reg_data_lost"))
+            await message.answer(t(lang, "reg_data_lost"))
             return
 
-        db.save_user_registration(
+        await db.save_user_registration(
             tg_id=message.from_user.id,
             first_name=first_name,
             last_name=last_name,
@@ -836,19 +889,19 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
         )
         await state.clear()
         await message.answer(
-            t(db, message.from_user.id, "reg_done_paid"),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            t(lang, "reg_done_paid"),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         await message.answer(
-            format_payment_text(db, message.from_user.id),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            await format_payment_text(db, lang),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
 
     @dp.callback_query(F.data.startswith("pay:"))
-    async def payment_decision_handler(callback: CallbackQuery) -> None:
+    async def payment_decision_handler(callback: CallbackQuery, user_ctx: UserContext) -> None:
         if not callback.from_user:
             return
-        if not db.is_admin(callback.from_user.id):
+        if not user_ctx.is_admin:
             await callback.answer("Faqat admin", show_alert=True)
             return
 
@@ -864,7 +917,7 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await callback.answer("Payment ID xato")
             return
 
-        payment = db.get_payment(payment_id)
+        payment = await db.get_payment(payment_id)
         if not payment:
             await callback.answer("Payment topilmadi", show_alert=True)
             return
@@ -874,20 +927,21 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             return
 
         new_status = "approved" if action == "approve" else "rejected"
-        updated = db.update_payment_status(payment_id, new_status, callback.from_user.id)
+        updated = await db.update_payment_status(payment_id, new_status, callback.from_user.id)
         if not updated:
             await callback.answer("Payment holatini o'zgartirib bo'lmadi", show_alert=True)
             return
 
         user_id = int(payment["user_tg_id"])
+        lang = await user_lang(db, user_id)
         if new_status == "approved":
-            db.add_credits(user_id, 1)
-            db.reset_no_payment_attempts(user_id)
+            await db.add_credits(user_id, 1)
+            await db.reset_no_payment_attempts(user_id)
             try:
                 await callback.bot.send_message(
                     user_id,
-                    t(db, user_id, "payment_approved"),
-                    reply_markup=user_menu_keyboard(db, user_id),
+                    t(lang, "payment_approved"),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
             except TelegramBadRequest:
                 pass
@@ -896,8 +950,8 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             try:
                 await callback.bot.send_message(
                     user_id,
-                    t(db, user_id, "payment_rejected"),
-                    reply_markup=user_menu_keyboard(db, user_id),
+                    t(lang, "payment_rejected"),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
             except TelegramBadRequest:
                 pass
@@ -915,109 +969,169 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             except TelegramBadRequest:
                 pass
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == ADMIN_PANEL_TEXT.casefold())
-    async def admin_panel_text(message: Message, state: FSMContext) -> None:
+    async def admin_reply_target(message: Message, is_admin: bool = False) -> Union[bool, Dict[str, Any]]:
+        reply = message.reply_to_message
+        if reply is None or not reply.from_user or not reply.from_user.is_bot:
+            return False
+        if not is_admin and str(message.chat.id) != (await db.get_setting("inbox_chat_id", "")).strip():
+            return False
+        target = await db.get_message_link_target(message.chat.id, reply.message_id)
+        if target is None:
+            return False
+        return {"reply_target": target}
+
+    @dp.message(admin_reply_target)
+    async def admin_reply_relay(message: Message, reply_target: Tuple[int, Optional[int]]) -> None:
+        user_id, user_message_id = reply_target
+        reply_parameters = (
+            ReplyParameters(message_id=user_message_id, allow_sending_without_reply=True)
+            if user_message_id is not None
+            else None
+        )
+        try:
+            await message.bot.copy_message(
+                chat_id=user_id,
+                from_chat_id=message.chat.id,
+                message_id=message.message_id,
+                reply_parameters=reply_parameters,
+            )
+        except TelegramForbiddenError:
+            await message.reply("Foydalanuvchi botni bloklagan.")
+        except TelegramBadRequest as exc:
+            await message.reply(f"Javob yuborilmadi: {h(exc.message)}")
+
+    admin_buttons = ButtonRouter()
+    dp.message.register(admin_buttons.dispatch, admin_buttons)
+
+    @admin_buttons.route(ADMIN_PANEL_TEXT)
+    async def admin_panel_text(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if not message.from_user:
             return
-        if not db.is_admin(message.from_user.id):
+        if not user_ctx.is_admin:
             await message.answer("Siz admin emassiz.")
             return
         await state.clear()
         await message.answer("Admin panel:", reply_markup=admin_main_menu_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_EXIT.casefold())
-    async def admin_panel_close(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_EXIT)
+    async def admin_panel_close(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer("Admin panel yopildi.", reply_markup=admin_entry_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_BACK.casefold())
-    async def admin_panel_back(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_BACK)
+    async def admin_panel_back(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer("Admin panel:", reply_markup=admin_main_menu_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_STATS.casefold())
-    async def admin_menu_stats(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_STATS)
+    async def admin_menu_stats(
+        message: Message,
+        state: FSMContext,
+        user_ctx: UserContext,
+        rate_limiter: Optional[RateLimitMiddleware] = None,
+        scheduler: Optional[Scheduler] = None,
+        throttle: Optional[ThrottleMiddleware] = None,
+    ) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
-        stats = db.payment_stats()
+        stats = await db.payment_stats()
+        cache_stats = await db.settings_cache_stats()
+        outbox_stats = await db.outbox_stats()
         text = (
             "Statistika:\n"
-            f"Users: {db.total_users()}\n"
-            f"Yuborilgan xabarlar: {db.total_user_messages()}\n"
+            f"Users: {await db.total_users()}\n"
+            f"Botni bloklaganlar: {await db.blocked_users()}\n"
+            f"Faol xabar yuborishlar: {len(await db.list_running_broadcasts())}\n"
+            f"Yuborilgan xabarlar: {await db.total_user_messages()}\n"
             f"To'lov pending: {stats.get('pending', 0)}\n"
             f"To'lov approved: {stats.get('approved', 0)}\n"
-            f"To'lov rejected: {stats.get('rejected', 0)}"
+            f"To'lov rejected: {stats.get('rejected', 0)}\n"
+            f"Sozlamalar keshi: {cache_stats['hits']} hit / {cache_stats['misses']} miss\n"
+            f"Obuna keshi: {subscriptions.cache.hits} hit / {subscriptions.cache.misses} miss\n"
+            f"Obuna live tekshiruvlari: {subscriptions.live_checks}\n"
+            f"Outbox: {outbox_stats.get('pending', 0)} kutmoqda / {outbox_stats.get('failed', 0)} xato"
         )
+        if rate_limiter is not None:
+            text += (
+                f"\nYuborish navbati: {rate_limiter.queue_depth}\n"
+                f"Flood limit qayta urinishlar: {rate_limiter.retries}"
+            )
+        if scheduler is not None:
+            runs = sum(stats.runs for stats in scheduler.stats.values())
+            failures = sum(stats.failures for stats in scheduler.stats.values())
+            text += f"\nVazifalar: {runs} bajarildi / {failures} xato"
+        if throttle is not None:
+            text += f"\nFlood: {sum(throttle.dropped.values())} tashlandi / {throttle.tracked_users} kuzatuvda"
         await message.answer(text, reply_markup=admin_main_menu_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CHANNELS.casefold())
-    async def admin_menu_channels(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CHANNELS)
+    async def admin_menu_channels(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_channels_text(db.list_channels()),
+            format_channels_text(await db.list_channels()),
             reply_markup=admin_channels_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CARDS.casefold())
-    async def admin_menu_cards(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CARDS)
+    async def admin_menu_cards(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_cards_text(db.list_cards()),
+            format_cards_text(await db.list_cards()),
             reply_markup=admin_cards_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_SETTINGS.casefold())
-    async def admin_menu_settings(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_SETTINGS)
+    async def admin_menu_settings(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_settings_text(db),
+            await format_settings_text(db),
             reply_markup=admin_settings_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_ADMINS.casefold())
-    async def admin_menu_admins(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_ADMINS)
+    async def admin_menu_admins(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_admins_text(db.list_admins()),
+            format_admins_text(await db.list_admins()),
             reply_markup=admin_admins_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_MENUS.casefold())
-    async def admin_menu_custom(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_MENUS)
+    async def admin_menu_custom(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_custom_menus_text(db.list_custom_menus()),
+            format_custom_menus_text(await db.list_custom_menus()),
             reply_markup=admin_custom_menus_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CUSTOM_MENU_LIST.casefold())
-    async def admin_custom_menu_list_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CUSTOM_MENU_LIST)
+    async def admin_custom_menu_list_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_custom_menus_text(db.list_custom_menus()),
+            format_custom_menus_text(await db.list_custom_menus()),
             reply_markup=admin_custom_menus_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CUSTOM_MENU_ADD.casefold())
-    async def admin_custom_menu_add_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CUSTOM_MENU_ADD)
+    async def admin_custom_menu_add_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_custom_menu_name)
         await message.answer(
@@ -1025,29 +1139,29 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             reply_markup=admin_custom_menus_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CUSTOM_MENU_REMOVE.casefold())
-    async def admin_custom_menu_remove_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CUSTOM_MENU_REMOVE)
+    async def admin_custom_menu_remove_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_custom_menu_delete)
         await message.answer(
-            f"{format_custom_menus_text(db.list_custom_menus())}\n\nO'chirish uchun menyu ID yuboring.",
+            f"{format_custom_menus_text(await db.list_custom_menus())}\n\nO'chirish uchun menyu ID yuboring.",
             reply_markup=admin_custom_menus_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CHANNEL_LIST.casefold())
-    async def admin_channel_list_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CHANNEL_LIST)
+    async def admin_channel_list_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_channels_text(db.list_channels()),
+            format_channels_text(await db.list_channels()),
             reply_markup=admin_channels_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CHANNEL_ADD.casefold())
-    async def admin_channel_add_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CHANNEL_ADD)
+    async def admin_channel_add_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_channel_add)
         await message.answer(
@@ -1056,66 +1170,66 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             reply_markup=admin_channels_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CHANNEL_REMOVE.casefold())
-    async def admin_channel_remove_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CHANNEL_REMOVE)
+    async def admin_channel_remove_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_channel_remove)
         await message.answer(
-            f"{format_channels_text(db.list_channels())}\n\nO'chirish uchun kanal ID yuboring.",
+            f"{format_channels_text(await db.list_channels())}\n\nO'chirish uchun kanal ID yuboring.",
             reply_markup=admin_channels_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CARD_LIST.casefold())
-    async def admin_card_list_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CARD_LIST)
+    async def admin_card_list_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_cards_text(db.list_cards()),
+            format_cards_text(await db.list_cards()),
             reply_markup=admin_cards_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CARD_ADD.casefold())
-    async def admin_card_add_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CARD_ADD)
+    async def admin_card_add_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_card_owner)
         await message.answer("Yangi karta egasini yuboring.", reply_markup=admin_cards_menu_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CARD_ACTIVATE.casefold())
-    async def admin_card_activate_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CARD_ACTIVATE)
+    async def admin_card_activate_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_card_activate)
         await message.answer(
-            f"{format_cards_text(db.list_cards())}\n\nAktiv qilish uchun karta ID yuboring.",
+            f"{format_cards_text(await db.list_cards())}\n\nAktiv qilish uchun karta ID yuboring.",
             reply_markup=admin_cards_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_CARD_REMOVE.casefold())
-    async def admin_card_remove_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_CARD_REMOVE)
+    async def admin_card_remove_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_card_delete)
         await message.answer(
-            f"{format_cards_text(db.list_cards())}\n\nO'chirish uchun karta ID yuboring.",
+            f"{format_cards_text(await db.list_cards())}\n\nO'chirish uchun karta ID yuboring.",
             reply_markup=admin_cards_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_SETTING_LIST.casefold())
-    async def admin_setting_list_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_SETTING_LIST)
+    async def admin_setting_list_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_settings_text(db),
+            await format_settings_text(db),
             reply_markup=admin_settings_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_SETTING_INSTAGRAM.casefold())
-    async def admin_setting_instagram_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_SETTING_INSTAGRAM)
+    async def admin_setting_instagram_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_instagram_url)
         await message.answer(
@@ -1123,9 +1237,9 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             reply_markup=admin_settings_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_SETTING_THRESHOLD.casefold())
-    async def admin_setting_threshold_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_SETTING_THRESHOLD)
+    async def admin_setting_threshold_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_suspicious_threshold)
         await message.answer(
@@ -1133,9 +1247,9 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             reply_markup=admin_settings_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_SETTING_INBOX.casefold())
-    async def admin_setting_inbox_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_SETTING_INBOX)
+    async def admin_setting_inbox_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_inbox_chat_id)
         await message.answer(
@@ -1145,19 +1259,19 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             reply_markup=admin_settings_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_ADMIN_LIST.casefold())
-    async def admin_admin_list_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_ADMIN_LIST)
+    async def admin_admin_list_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.clear()
         await message.answer(
-            format_admins_text(db.list_admins()),
+            format_admins_text(await db.list_admins()),
             reply_markup=admin_admins_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_ADMIN_ADD.casefold())
-    async def admin_admin_add_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_ADMIN_ADD)
+    async def admin_admin_add_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_admin_add)
         await message.answer(
@@ -1165,36 +1279,47 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             reply_markup=admin_admins_menu_keyboard(),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() == BTN_ADMIN_REMOVE.casefold())
-    async def admin_admin_remove_action(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    @admin_buttons.route(BTN_ADMIN_REMOVE)
+    async def admin_admin_remove_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         await state.set_state(AdminStates.waiting_admin_remove)
         await message.answer(
-            f"{format_admins_text(db.list_admins())}\n\nO'chirish uchun admin ID yuboring.",
+            f"{format_admins_text(await db.list_admins())}\n\nO'chirish uchun admin ID yuboring.",
             reply_markup=admin_admins_menu_keyboard(),
         )
 
+    @admin_buttons.route(BTN_BROADCAST)
+    async def admin_broadcast_action(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
+            return
+        await state.set_state(AdminStates.waiting_broadcast_message)
+        await message.answer(
+            "Barcha foydalanuvchilarga yuboriladigan xabarni yuboring.\n"
+            "Bekor qilish: /cancel",
+            reply_markup=admin_main_menu_keyboard(),
+        )
+
     @dp.message(Command("cancel"))
-    async def cancel_any_state(message: Message, state: FSMContext) -> None:
+    async def cancel_any_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         await state.clear()
-        if message.from_user and db.is_admin(message.from_user.id):
+        if message.from_user and user_ctx.is_admin:
             await message.answer("Bekor qilindi.", reply_markup=admin_main_menu_keyboard())
         elif (
             message.from_user
-            and db.get_user_language(message.from_user.id)
-            and db.is_user_registered(message.from_user.id)
+            and user_ctx.language
+            and user_ctx.is_registered
         ):
             await message.answer(
                 "Bekor qilindi.",
-                reply_markup=user_menu_keyboard(db, message.from_user.id),
+                reply_markup=await user_menu_keyboard(db, normalize_lang(user_ctx.language)),
             )
         else:
             await message.answer("Bekor qilindi.")
 
     @dp.message(AdminStates.waiting_channel_add)
-    async def admin_add_channel_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_add_channel_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         text = (message.text or "").strip()
         if not text:
@@ -1217,22 +1342,24 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             return
 
         title = None
+        chat_id = None
         try:
             chat = await message.bot.get_chat(chat_ref)
             title = chat.title if chat.title else None
+            chat_id = chat.id
         except TelegramBadRequest:
             title = None
 
-        db.add_channel(chat_ref, join_url, title)
+        await db.add_channel(chat_ref, join_url, title, chat_id)
         await state.clear()
         await message.answer(
-            f"Kanal qo'shildi.\n\n{format_channels_text(db.list_channels())}",
+            f"Kanal qo'shildi.\n\n{format_channels_text(await db.list_channels())}",
             reply_markup=admin_channels_menu_keyboard(),
         )
 
     @dp.message(AdminStates.waiting_channel_remove)
-    async def admin_remove_channel_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_remove_channel_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             channel_id = int((message.text or "").strip())
@@ -1240,11 +1367,11 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("ID raqam bo'lishi kerak.")
             return
 
-        removed = db.remove_channel(channel_id)
+        removed = await db.remove_channel(channel_id)
         await state.clear()
         if removed:
             await message.answer(
-                f"Kanal o'chirildi.\n\n{format_channels_text(db.list_channels())}",
+                f"Kanal o'chirildi.\n\n{format_channels_text(await db.list_channels())}",
                 reply_markup=admin_channels_menu_keyboard(),
             )
         else:
@@ -1254,8 +1381,8 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             )
 
     @dp.message(AdminStates.waiting_card_owner)
-    async def admin_wait_card_owner_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_wait_card_owner_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         owner = (message.text or "").strip()
         if len(owner) < 2:
@@ -1266,8 +1393,8 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
         await message.answer("Karta raqamini yuboring (masalan: 8600 1234 5678 9012).")
 
     @dp.message(AdminStates.waiting_card_number)
-    async def admin_wait_card_number_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_wait_card_number_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         number = (message.text or "").strip()
         digits = "".join(ch for ch in number if ch.isdigit())
@@ -1277,16 +1404,16 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
 
         data = await state.get_data()
         owner = data.get("card_owner", "")
-        db.add_card(owner_name=owner, card_number=number, activate=False)
+        await db.add_card(owner_name=owner, card_number=number, activate=False)
         await state.clear()
         await message.answer(
-            f"Karta saqlandi.\n\n{format_cards_text(db.list_cards())}",
+            f"Karta saqlandi.\n\n{format_cards_text(await db.list_cards())}",
             reply_markup=admin_cards_menu_keyboard(),
         )
 
     @dp.message(AdminStates.waiting_card_activate)
-    async def admin_activate_card_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_activate_card_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             card_id = int((message.text or "").strip())
@@ -1294,19 +1421,19 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("ID raqam bo'lishi kerak.")
             return
 
-        ok = db.set_active_card(card_id)
+        ok = await db.set_active_card(card_id)
         await state.clear()
         if ok:
             await message.answer(
-                f"Aktiv karta yangilandi.\n\n{format_cards_text(db.list_cards())}",
+                f"Aktiv karta yangilandi.\n\n{format_cards_text(await db.list_cards())}",
                 reply_markup=admin_cards_menu_keyboard(),
             )
         else:
             await message.answer("Karta topilmadi.", reply_markup=admin_cards_menu_keyboard())
 
     @dp.message(AdminStates.waiting_card_delete)
-    async def admin_delete_card_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_delete_card_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             card_id = int((message.text or "").strip())
@@ -1314,19 +1441,19 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("ID raqam bo'lishi kerak.")
             return
 
-        ok = db.remove_card(card_id)
+        ok = await db.remove_card(card_id)
         await state.clear()
         if ok:
             await message.answer(
-                f"Karta o'chirildi.\n\n{format_cards_text(db.list_cards())}",
+                f"Karta o'chirildi.\n\n{format_cards_text(await db.list_cards())}",
                 reply_markup=admin_cards_menu_keyboard(),
             )
         else:
             await message.answer("Karta topilmadi.", reply_markup=admin_cards_menu_keyboard())
 
     @dp.message(AdminStates.waiting_admin_add)
-    async def admin_add_admin_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_add_admin_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             admin_id = int((message.text or "").strip())
@@ -1334,16 +1461,16 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("Telegram ID raqam bo'lishi kerak.")
             return
 
-        db.add_admin(admin_id)
+        await db.add_admin(admin_id)
         await state.clear()
         await message.answer(
-            f"Admin qo'shildi.\n\n{format_admins_text(db.list_admins())}",
+            f"Admin qo'shildi.\n\n{format_admins_text(await db.list_admins())}",
             reply_markup=admin_admins_menu_keyboard(),
         )
 
     @dp.message(AdminStates.waiting_admin_remove)
-    async def admin_remove_admin_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_remove_admin_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             admin_id = int((message.text or "").strip())
@@ -1358,19 +1485,19 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("ADMIN2_ID ni o'chirib bo'lmaydi.")
             return
 
-        removed = db.remove_admin(admin_id)
+        removed = await db.remove_admin(admin_id)
         await state.clear()
         if removed:
             await message.answer(
-                f"Admin o'chirildi.\n\n{format_admins_text(db.list_admins())}",
+                f"Admin o'chirildi.\n\n{format_admins_text(await db.list_admins())}",
                 reply_markup=admin_admins_menu_keyboard(),
             )
         else:
             await message.answer("Admin topilmadi.", reply_markup=admin_admins_menu_keyboard())
 
     @dp.message(AdminStates.waiting_custom_menu_name)
-    async def admin_custom_menu_name_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_custom_menu_name_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         name = (message.text or "").strip()
         if not name:
@@ -1388,8 +1515,8 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
         await message.answer("Endi shu tugma bosilganda chiqadigan matnni yuboring.")
 
     @dp.message(AdminStates.waiting_custom_menu_text)
-    async def admin_custom_menu_text_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_custom_menu_text_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         response_text = (message.text or "").strip()
         if not response_text:
@@ -1409,17 +1536,17 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             )
             return
 
-        created = db.save_custom_menu(name, response_text)
+        created = await db.save_custom_menu(name, response_text)
         await state.clear()
         status_text = "Menyu qo'shildi." if created else "Menyu yangilandi."
         await message.answer(
-            f"{status_text}\n\n{format_custom_menus_text(db.list_custom_menus())}",
+            f"{status_text}\n\n{format_custom_menus_text(await db.list_custom_menus())}",
             reply_markup=admin_custom_menus_keyboard(),
         )
 
     @dp.message(AdminStates.waiting_custom_menu_delete)
-    async def admin_custom_menu_delete_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_custom_menu_delete_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             menu_id = int((message.text or "").strip())
@@ -1427,11 +1554,11 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("ID raqam bo'lishi kerak.")
             return
 
-        removed = db.remove_custom_menu(menu_id)
+        removed = await db.remove_custom_menu(menu_id)
         await state.clear()
         if removed:
             await message.answer(
-                f"Menyu o'chirildi.\n\n{format_custom_menus_text(db.list_custom_menus())}",
+                f"Menyu o'chirildi.\n\n{format_custom_menus_text(await db.list_custom_menus())}",
                 reply_markup=admin_custom_menus_keyboard(),
             )
         else:
@@ -1441,12 +1568,12 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             )
 
     @dp.message(AdminStates.waiting_instagram_url)
-    async def admin_set_instagram_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_set_instagram_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         value = (message.text or "").strip()
         if value == "-":
-            db.set_setting("instagram_url", "")
+            await db.set_setting("instagram_url", "")
             await state.clear()
             await message.answer("Instagram URL tozalandi.", reply_markup=admin_settings_menu_keyboard())
             return
@@ -1454,13 +1581,13 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("Instagram URL xato. To'g'ri URL yuboring.")
             return
 
-        db.set_setting("instagram_url", value)
+        await db.set_setting("instagram_url", value)
         await state.clear()
         await message.answer("Instagram URL saqlandi.", reply_markup=admin_settings_menu_keyboard())
 
     @dp.message(AdminStates.waiting_suspicious_threshold)
-    async def admin_set_threshold_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_set_threshold_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
         try:
             threshold = int((message.text or "").strip())
@@ -1471,18 +1598,18 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("Limit 1 dan 100 gacha bo'lishi kerak.")
             return
 
-        db.set_setting("suspicious_threshold", str(threshold))
+        await db.set_setting("suspicious_threshold", str(threshold))
         await state.clear()
         await message.answer("Shubhali limit saqlandi.", reply_markup=admin_settings_menu_keyboard())
 
     @dp.message(AdminStates.waiting_inbox_chat_id)
-    async def admin_set_inbox_chat_state(message: Message, state: FSMContext) -> None:
-        if not message.from_user or not db.is_admin(message.from_user.id):
+    async def admin_set_inbox_chat_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
             return
 
         value = (message.text or "").strip()
         if value == "-":
-            db.set_setting("inbox_chat_id", "")
+            await db.set_setting("inbox_chat_id", "")
             await state.clear()
             await message.answer("Qabul chat ID tozalandi.", reply_markup=admin_settings_menu_keyboard())
             return
@@ -1491,117 +1618,137 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
             await message.answer("Chat ID xato. Misol: -1001234567890 yoki @kanal_username")
             return
 
-        db.set_setting("inbox_chat_id", value)
+        await db.set_setting("inbox_chat_id", value)
         await state.clear()
         await message.answer("Qabul chat ID saqlandi.", reply_markup=admin_settings_menu_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() in PROFILE_BUTTON_TEXTS)
-    async def user_profile_menu(message: Message, state: FSMContext) -> None:
+    @dp.message(AdminStates.waiting_broadcast_message)
+    async def admin_broadcast_message_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
+        if not message.from_user or not user_ctx.is_admin:
+            return
+        broadcast_id = await broadcaster.start(message.bot, message.chat.id, message.chat.id, message.message_id)
+        await state.clear()
+        await message.answer(
+            f"Xabar yuborish #{broadcast_id} boshlandi. Tugagach natija yuboriladi.",
+            reply_markup=admin_main_menu_keyboard(),
+        )
+
+    user_buttons = ButtonRouter()
+    dp.message.register(user_buttons.dispatch, user_buttons)
+
+    @user_buttons.route(*PROFILE_BUTTON_TEXTS)
+    async def user_profile_menu(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
 
-        channels = db.list_channels()
-        missing = await get_missing_channels(message.bot, message.from_user.id, channels)
+        channels = await db.list_channels()
+        missing = await subscriptions.missing_channels(message.bot, message.from_user.id, channels)
         if missing:
-            await send_subscription_prompt(message, db, missing)
+            await send_subscription_prompt(message, db, missing, normalize_lang(user_ctx.language))
             return
 
-        if not db.get_user_language(message.from_user.id):
+        language = user_ctx.language
+        lang = normalize_lang(language)
+        if not language:
             await message.answer(
-                t(db, message.from_user.id, "lang_prompt"),
-                reply_markup=language_select_keyboard(),
+                t(lang, "lang_prompt"),
+                reply_markup=language_select_keyboard(LANGUAGE_BUTTONS),
             )
             return
 
-        if not db.is_user_registered(message.from_user.id):
-            await message.answer(t(db, message.from_user.id, "must_register"))
+        if not user_ctx.is_registered:
+            await message.answer(t(lang, "must_register"))
             return
 
         await state.clear()
         await message.answer(
-            format_profile_text(db, message.from_user.id),
-            reply_markup=user_profile_keyboard(db, message.from_user.id),
+            await format_profile_text(db, lang, message.from_user.id),
+            reply_markup=user_profile_keyboard(lang),
         )
 
-    @dp.message(lambda m: bool(m.text) and m.text.strip().casefold() in DELETE_BUTTON_TEXTS)
-    async def user_delete_data(message: Message, state: FSMContext) -> None:
+    @user_buttons.route(*DELETE_BUTTON_TEXTS)
+    async def user_delete_data(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
 
         user_id = message.from_user.id
-        deleted_text = t(db, user_id, "profile_deleted")
+        deleted_text = t(normalize_lang(user_ctx.language), "profile_deleted")
         await state.clear()
-        db.delete_user_data(user_id)
+        await db.delete_user_data(user_id)
         await message.answer(deleted_text, reply_markup=remove_reply_keyboard())
 
-    @dp.message(lambda m: bool(m.text) and bool(db.get_custom_menu_by_button((m.text or "").strip())))
-    async def user_custom_menu_text(message: Message, state: FSMContext) -> None:
+    @user_buttons.fallback(db.get_custom_menu_by_button)
+    async def user_custom_menu_text(
+        message: Message,
+        state: FSMContext,
+        user_ctx: UserContext,
+        button_match: Any,
+    ) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
         if await state.get_state():
             return
 
-        channels = db.list_channels()
-        missing = await get_missing_channels(message.bot, message.from_user.id, channels)
+        channels = await db.list_channels()
+        missing = await subscriptions.missing_channels(message.bot, message.from_user.id, channels)
         if missing:
-            await send_subscription_prompt(message, db, missing)
+            await send_subscription_prompt(message, db, missing, normalize_lang(user_ctx.language))
             return
 
-        if not db.get_user_language(message.from_user.id):
+        language = user_ctx.language
+        lang = normalize_lang(language)
+        if not language:
             await message.answer(
-                t(db, message.from_user.id, "lang_prompt"),
-                reply_markup=language_select_keyboard(),
+                t(lang, "lang_prompt"),
+                reply_markup=language_select_keyboard(LANGUAGE_BUTTONS),
             )
             return
 
-        if not db.is_user_registered(message.from_user.id):
-            await message.answer(t(db, message.from_user.id, "must_register"))
-            return
-
-        menu = db.get_custom_menu_by_button((message.text or "").strip())
-        if not menu:
+        if not user_ctx.is_registered:
+            await message.answer(t(lang, "must_register"))
             return
 
         await state.clear()
         await message.answer(
-            str(menu["response_text"]),
+            str(button_match["response_text"]),
             parse_mode=None,
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
 
     @dp.callback_query(F.data.startswith("user:profile:edit:"))
-    async def user_profile_edit_callback(callback: CallbackQuery, state: FSMContext) -> None:
+    async def user_profile_edit_callback(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext) -> None:
         if not callback.from_user:
             return
-        if db.is_admin(callback.from_user.id):
+        if user_ctx.is_admin:
             await callback.answer("Faqat foydalanuvchilar uchun", show_alert=True)
             return
-        if not db.is_user_registered(callback.from_user.id):
-            await callback.answer(t(db, callback.from_user.id, "must_register"), show_alert=True)
+        lang = normalize_lang(user_ctx.language)
+        if not user_ctx.is_registered:
+            await callback.answer(t(lang, "must_register"), show_alert=True)
             return
 
         field = (callback.data or "").split(":")[-1]
         if field == "first_name":
             await state.set_state(UserStates.editing_first_name)
-            prompt_text = t(db, callback.from_user.id, "profile_edit_first_prompt")
+            prompt_text = t(lang, "profile_edit_first_prompt")
             markup = None
         elif field == "last_name":
             await state.set_state(UserStates.editing_last_name)
-            prompt_text = t(db, callback.from_user.id, "profile_edit_last_prompt")
+            prompt_text = t(lang, "profile_edit_last_prompt")
             markup = None
         elif field == "phone":
             await state.set_state(UserStates.editing_phone)
-            prompt_text = t(db, callback.from_user.id, "profile_edit_phone_prompt")
-            markup = phone_request_keyboard(t(db, callback.from_user.id, "reg_phone_button"))
+            prompt_text = t(lang, "profile_edit_phone_prompt")
+            markup = phone_request_keyboard(t(lang, "reg_phone_button"))
         elif field == "birth_date":
             await state.set_state(UserStates.editing_birth_date)
-            prompt_text = t(db, callback.from_user.id, "profile_edit_birth_prompt")
+            prompt_text = t(lang, "profile_edit_birth_prompt")
             markup = remove_reply_keyboard()
         else:
             await callback.answer("Xato amal", show_alert=True)
@@ -1627,233 +1774,344 @@ def register_handlers(dp: Dispatcher, db: Database, config: Config) -> None:
         await callback.answer()
 
     @dp.message(UserStates.editing_first_name)
-    async def user_edit_first_name_state(message: Message, state: FSMContext) -> None:
+    async def user_edit_first_name_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
         value = (message.text or "").strip()
         if len(value) < 2:
-            await message.answer(t(db, message.from_user.id, "reg_first_invalid"))
+            await message.answer(t(lang, "reg_first_invalid"))
             return
-        db.update_user_first_name(message.from_user.id, value)
+        await db.update_user_first_name(message.from_user.id, value)
         await state.clear()
         await message.answer(
-            t(db, message.from_user.id, "profile_updated"),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            t(lang, "profile_updated"),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         await message.answer(
-            format_profile_text(db, message.from_user.id),
-            reply_markup=user_profile_keyboard(db, message.from_user.id),
+            await format_profile_text(db, lang, message.from_user.id),
+            reply_markup=user_profile_keyboard(lang),
         )
 
     @dp.message(UserStates.editing_last_name)
-    async def user_edit_last_name_state(message: Message, state: FSMContext) -> None:
+    async def user_edit_last_name_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
         value = (message.text or "").strip()
         if len(value) < 2:
-            await message.answer(t(db, message.from_user.id, "reg_last_invalid"))
+            await message.answer(t(lang, "reg_last_invalid"))
             return
-        db.update_user_last_name(message.from_user.id, value)
+        await db.update_user_last_name(message.from_user.id, value)
         await state.clear()
         await message.answer(
-            t(db, message.from_user.id, "profile_updated"),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            t(lang, "profile_updated"),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         await message.answer(
-            format_profile_text(db, message.from_user.id),
-            reply_markup=user_profile_keyboard(db, message.from_user.id),
+            await format_profile_text(db, lang, message.from_user.id),
+            reply_markup=user_profile_keyboard(lang),
         )
 
     @dp.message(UserStates.editing_phone)
-    async def user_edit_phone_state(message: Message, state: FSMContext) -> None:
+    async def user_edit_phone_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
 
         phone_value: Optional[str]
         if message.contact:
             if message.contact.user_id and message.contact.user_id != message.from_user.id:
-                await message.answer(t(db, message.from_user.id, "reg_phone_self_only"))
+                await message.answer(t(lang, "reg_phone_self_only"))
                 return
             phone_value = normalize_phone(message.contact.phone_number or "")
         else:
             phone_value = normalize_phone(message.text or "")
 
         if not phone_value:
-            await message.answer(t(db, message.from_user.id, "reg_phone_invalid"))
+            await message.answer(t(lang, "reg_phone_invalid"))
             return
 
-        db.update_user_phone(message.from_user.id, phone_value)
+        await db.update_user_phone(message.from_user.id, phone_value)
         await state.clear()
         await message.answer(
-            t(db, message.from_user.id, "profile_updated"),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            t(lang, "profile_updated"),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         await message.answer(
-            format_profile_text(db, message.from_user.id),
-            reply_markup=user_profile_keyboard(db, message.from_user.id),
+            await format_profile_text(db, lang, message.from_user.id),
+            reply_markup=user_profile_keyboard(lang),
         )
 
     @dp.message(UserStates.editing_birth_date)
-    async def user_edit_birth_date_state(message: Message, state: FSMContext) -> None:
+    async def user_edit_birth_date_state(message: Message, state: FSMContext, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
+        lang = normalize_lang(user_ctx.language)
 
         birth_date = parse_birth_date(message.text or "")
         if not birth_date:
-            await message.answer(t(db, message.from_user.id, "reg_birth_invalid"))
+            await message.answer(t(lang, "reg_birth_invalid"))
             return
 
-        db.update_user_birth_date(message.from_user.id, birth_date)
+        await db.update_user_birth_date(message.from_user.id, birth_date)
         await state.clear()
         await message.answer(
-            t(db, message.from_user.id, "profile_updated"),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            t(lang, "profile_updated"),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
         await message.answer(
-            format_profile_text(db, message.from_user.id),
-            reply_markup=user_profile_keyboard(db, message.from_user.id),
+            await format_profile_text(db, lang, message.from_user.id),
+            reply_markup=user_profile_keyboard(lang),
         )
 
     @dp.message()
-    async def user_main_flow(message: Message) -> None:
+    async def user_main_flow(message: Message, user_ctx: UserContext) -> None:
         if message.chat.type != "private" or not message.from_user:
             return
 
-        if db.is_admin(message.from_user.id):
+        if user_ctx.is_admin:
             return
 
-        db.upsert_user(
+        await db.upsert_user(
             tg_id=message.from_user.id,
             username=message.from_user.username,
             full_name=user_display_name(message),
         )
 
-        channels = db.list_channels()
-        missing = await get_missing_channels(message.bot, message.from_user.id, channels)
+        channels = await db.list_channels()
+        missing = await subscriptions.missing_channels(message.bot, message.from_user.id, channels)
         if missing:
-            await send_subscription_prompt(message, db, missing)
+            await send_subscription_prompt(message, db, missing, normalize_lang(user_ctx.language))
             return
 
-        if not db.get_user_language(message.from_user.id):
+        language = user_ctx.language
+        lang = normalize_lang(language)
+        if not language:
             await message.answer(
-                t(db, message.from_user.id, "lang_prompt"),
-                reply_markup=language_select_keyboard(),
+                t(lang, "lang_prompt"),
+                reply_markup=language_select_keyboard(LANGUAGE_BUTTONS),
             )
             return
 
-        if not db.is_user_registered(message.from_user.id):
-            await message.answer(t(db, message.from_user.id, "must_register"))
+        if not user_ctx.is_registered:
+            await message.answer(t(lang, "must_register"))
             return
 
-        credits = db.get_credits(message.from_user.id)
-        if credits > 0:
-            consumed = db.consume_credit(message.from_user.id, 1)
+        if user_ctx.credits > 0:
+            consumed = await db.consume_credit(message.from_user.id, 1)
             if not consumed:
                 await message.answer(
-                    t(db, message.from_user.id, "send_error_restart"),
-                    reply_markup=user_menu_keyboard(db, message.from_user.id),
+                    t(lang, "send_error_restart"),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
                 return
 
-            sent_count = await forward_user_message_to_admins(message.bot, db, message)
+            sent_count = await forward_user_message_to_admins(outbox, db, message)
             if sent_count == 0:
-                db.add_credits(message.from_user.id, 1)
+                await db.add_credits(message.from_user.id, 1)
                 await message.answer(
-                    t(db, message.from_user.id, "admin_send_failed"),
-                    reply_markup=user_menu_keyboard(db, message.from_user.id),
+                    t(lang, "admin_send_failed"),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
                 return
 
-            remaining = db.get_credits(message.from_user.id)
+            remaining = await db.get_credits(message.from_user.id)
             if remaining > 0:
                 await message.answer(
-                    t(db, message.from_user.id, "msg_sent_remaining", remaining=remaining),
-                    reply_markup=user_menu_keyboard(db, message.from_user.id),
+                    t(lang, "msg_sent_remaining", remaining=remaining),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
             else:
                 await message.answer(
-                    t(db, message.from_user.id, "msg_sent_pay_again"),
-                    reply_markup=user_menu_keyboard(db, message.from_user.id),
+                    t(lang, "msg_sent_pay_again"),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
                 await message.answer(
-                    format_payment_text(db, message.from_user.id),
-                    reply_markup=user_menu_keyboard(db, message.from_user.id),
+                    await format_payment_text(db, lang),
+                    reply_markup=await user_menu_keyboard(db, lang),
                 )
             return
 
-        pending = db.get_pending_payment(message.from_user.id)
-        if pending:
+        if user_ctx.pending_payment_id is not None:
             await message.answer(
-                t(db, message.from_user.id, "receipt_wait"),
-                reply_markup=user_menu_keyboard(db, message.from_user.id),
+                t(lang, "receipt_wait"),
+                reply_markup=await user_menu_keyboard(db, lang),
             )
             return
 
         receipt = extract_receipt(message)
         if receipt:
             receipt_type, file_id = receipt
-            payment_id = db.create_payment(
+            payment_id = await db.create_payment(
                 user_tg_id=message.from_user.id,
                 receipt_file_id=file_id,
                 receipt_type=receipt_type,
                 receipt_caption=message.caption,
             )
-            await send_payment_to_admins(message.bot, db, message, payment_id)
+            await send_payment_to_admins(outbox, db, message, payment_id)
             await message.answer(
-                t(db, message.from_user.id, "receipt_accepted", payment_id=payment_id),
-                reply_markup=user_menu_keyboard(db, message.from_user.id),
+                t(lang, "receipt_accepted", payment_id=payment_id),
+                reply_markup=await user_menu_keyboard(db, lang),
             )
             return
 
-        attempts = db.increment_no_payment_attempt(message.from_user.id)
-        threshold = db.get_int_setting("suspicious_threshold", 3)
+        attempts = await db.increment_no_payment_attempt(message.from_user.id)
+        threshold = await db.get_int_setting("suspicious_threshold", 3)
         if attempts >= threshold:
-            db.reset_no_payment_attempts(message.from_user.id)
-            await alert_suspicious_attempt(message.bot, db, message, attempts)
+            await db.reset_no_payment_attempts(message.from_user.id)
+            await alert_suspicious_attempt(outbox, db, message, attempts)
 
         await message.answer(
-            format_payment_text(db, message.from_user.id),
-            reply_markup=user_menu_keyboard(db, message.from_user.id),
+            await format_payment_text(db, lang),
+            reply_markup=await user_menu_keyboard(db, lang),
         )
 
 
-async def run_bot() -> None:
-    config = load_config()
-    db = Database(config.db_path)
-    db.ensure_super_admin(config.super_admin_id)
-    if config.admin2_id is not None:
-        db.add_admin(config.admin2_id)
+async def run_webhook(dp: Dispatcher, bot: Bot, config: Config) -> None:
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=config.webhook_secret).register(
+        app, path=config.webhook_path
+    )
+    setup_application(app, dp, bot=bot)
 
+    await bot.set_webhook(
+        f"{config.webhook_base_url}{config.webhook_path}",
+        secret_token=config.webhook_secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=min(config.webhook_max_concurrent_updates, 100),
+    )
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.webapp_host, config.webapp_port)
+    await site.start()
+    logging.info("Webhook server listening on %s:%s", config.webapp_host, config.webapp_port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def open_database(config: Config) -> AsyncDatabase:
+    return AsyncDatabase(
+        Database(
+            config.db_path,
+            mode=config.db_mode,
+            read_pool_size=config.db_read_pool_size,
+            commit_interval=config.db_commit_interval_ms / 1000,
+            commit_batch_size=config.db_commit_batch_size,
+        )
+    )
+
+
+def create_bot(config: Config) -> Tuple[Bot, RateLimitMiddleware]:
+    processes = config.workers + 1 if config.workers > 1 else 1
     bot = Bot(
         token=config.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher()
-    register_handlers(dp, db, config)
-    birthday_task = asyncio.create_task(birthday_notifier_loop(bot, db))
+    rate_limiter = RateLimitMiddleware(
+        global_rate=config.rate_limit_global_per_second / processes,
+        chat_rate=config.rate_limit_chat_per_second,
+        group_rate=config.rate_limit_group_per_minute / 60,
+    )
+    bot.session.middleware(rate_limiter)
+    return bot, rate_limiter
+
+
+async def run_bot() -> None:
+    config = load_config()
+    db = open_database(config)
+    await db.ensure_super_admin(config.super_admin_id)
+    if config.admin2_id is not None:
+        await db.add_admin(config.admin2_id)
+
+    bot, rate_limiter = create_bot(config)
+    scheduler = Scheduler(db)
+    throttle = ThrottleMiddleware(db, config.flood_rate_per_minute / 60, config.flood_burst)
+    dp = Dispatcher(storage=SQLiteStorage(db), rate_limiter=rate_limiter, scheduler=scheduler, throttle=throttle)
+    dp.update.outer_middleware(throttle)
+    workers: Optional[WorkerPool] = None
+    if config.workers > 1:
+        workers = WorkerPool(config.workers, run_worker)
+        dp.update.outer_middleware(ShardRouter(workers.queues))
+        outbox = Outbox(db, poll_interval=OUTBOX_POLL_INTERVAL)
+    else:
+        if config.run_mode == "webhook":
+            dp.update.outer_middleware(ConcurrencyLimitMiddleware(config.webhook_max_concurrent_updates))
+        outbox = Outbox(db)
+    broadcaster = Broadcaster(db)
+    register_handlers(dp, db, config, outbox, broadcaster)
+    register_jobs(scheduler, db, outbox, config)
+    tasks = [asyncio.create_task(outbox.run(bot)), asyncio.create_task(scheduler.run())]
+    if workers is not None:
+        workers.start()
+        tasks += [
+            asyncio.create_task(workers.supervise()),
+            asyncio.create_task(sync_caches(db)),
+            asyncio.create_task(broadcaster.watch(bot)),
+        ]
 
     try:
-        await dp.start_polling(bot)
+        if config.run_mode == "webhook":
+            await run_webhook(dp, bot, config)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        for task in tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if workers is not None:
+            await workers.stop()
+        await scheduler.stop()
+        await db.close()
+
+
+async def run_shard(updates: Any) -> None:
+    config = load_config()
+    db = open_database(config)
+    bot, rate_limiter = create_bot(config)
+    dp = Dispatcher(storage=SQLiteStorage(db), rate_limiter=rate_limiter)
+    dp.update.outer_middleware(ConcurrencyLimitMiddleware(config.worker_max_concurrent_updates))
+    register_handlers(dp, db, config, Outbox(db), Broadcaster(db, deliver=False))
+    cache_sync = asyncio.create_task(sync_caches(db))
+    try:
+        await consume_updates(updates, dp, bot)
     finally:
-        birthday_task.cancel()
+        cache_sync.cancel()
         try:
-            await birthday_task
+            await cache_sync
         except asyncio.CancelledError:
             pass
-        db.close()
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await bot.session.close()
+        await db.close()
 
 
-if __name__ == "__main__":
+def run_worker(index: int, updates: Any) -> None:
+    configure_logging()
+    asyncio.run(run_shard(updates))
+
+
+def configure_logging() -> None:
     logging.basicConfig(level=logging.WARNING)
     logging.getLogger("aiogram").setLevel(logging.WARNING)
     logging.getLogger("aiogram.dispatcher").setLevel(logging.WARNING)
     logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+
+if __name__ == "__main__":
+    configure_logging()
     asyncio.run(run_bot())
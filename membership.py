@@ -0,0 +1,139 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import Chat
+
+from database import AsyncDatabase
+
+SUBSCRIPTION_CHECK_MODES = ("live", "events")
+
+NON_MEMBER_STATUSES = {ChatMemberStatus.LEFT, ChatMemberStatus.KICKED}
+
+CHANNEL_MEMBERS_MAX_AGE = timedelta(hours=24)
+
+
+class MembershipCache:
+    def __init__(self, positive_ttl: float, negative_ttl: float, max_entries: int = 100_000) -> None:
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Tuple[int, str], Tuple[bool, float]] = {}
+
+    def get(self, user_id: int, chat_ref: str) -> Optional[bool]:
+        entry = self._entries.get((user_id, chat_ref))
+        if entry is None or entry[1] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def set(self, user_id: int, chat_ref: str, is_member: bool) -> None:
+        if len(self._entries) >= self.max_entries:
+            self._evict_expired()
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        self._entries[(user_id, chat_ref)] = (is_member, time.monotonic() + ttl)
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[1] > now}
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+
+
+def match_channel(channels: List[Any], chat: Chat) -> Optional[Any]:
+    username = f"@{chat.username}".casefold() if chat.username else None
+    for row in channels:
+        if row["chat_id"] == chat.id:
+            return row
+        chat_ref = str(row["chat_ref"])
+        if chat_ref == str(chat.id) or (username and chat_ref.casefold() == username):
+            return row
+    return None
+
+
+class SubscriptionChecker:
+    def __init__(self, db: AsyncDatabase, cache: MembershipCache, mode: str = "live") -> None:
+        if mode not in SUBSCRIPTION_CHECK_MODES:
+            raise ValueError(f"Unknown subscription check mode: {mode}")
+        self.db = db
+        self.cache = cache
+        self.mode = mode
+        self.live_checks = 0
+
+    async def missing_channels(
+        self, bot: Bot, user_id: int, channels: List[Any], force: bool = False
+    ) -> List[str]:
+        stored: Dict[int, bool] = {}
+        if self.mode == "events" and not force:
+            stored = await self.db.get_channel_memberships(user_id)
+
+        missing: List[str] = []
+        for row in channels:
+            chat_ref = str(row["chat_ref"])
+            chat_id = row["chat_id"]
+            is_member = stored.get(chat_id) if chat_id is not None else None
+            if is_member is None and not force:
+                is_member = self.cache.get(user_id, chat_ref)
+            if is_member is None:
+                is_member = await self._check_live(bot, user_id, chat_ref, chat_id)
+            if not is_member:
+                missing.append(chat_ref)
+        return missing
+
+    async def _check_live(self, bot: Bot, user_id: int, chat_ref: str, chat_id: Optional[int]) -> bool:
+        self.live_checks += 1
+        try:
+            member = await bot.get_chat_member(chat_id=chat_ref, user_id=user_id)
+        except TelegramBadRequest:
+            self.cache.set(user_id, chat_ref, False)
+            return False
+        is_member = member.status not in NON_MEMBER_STATUSES
+        self.cache.set(user_id, chat_ref, is_member)
+        if self.mode == "events" and chat_id is not None:
+            await self.db.set_channel_member(chat_id, user_id, is_member)
+        return is_member
+
+    async def record_member(self, chat: Chat, user_id: int, status: str) -> bool:
+        row = await self._resolve_channel(chat)
+        if row is None:
+            return False
+        is_member = status not in NON_MEMBER_STATUSES
+        await self.db.set_channel_member(chat.id, user_id, is_member)
+        self.cache.set(user_id, str(row["chat_ref"]), is_member)
+        return True
+
+    async def record_bot_status(self, chat: Chat, status: str) -> None:
+        row = await self._resolve_channel(chat)
+        if row is None:
+            return
+        if status != ChatMemberStatus.ADMINISTRATOR:
+            await self.db.clear_channel_members(chat.id)
+
+    async def reconcile(self, bot: Bot) -> None:
+        for row in await self.db.list_channels():
+            if row["chat_id"] is not None:
+                continue
+            try:
+                chat = await bot.get_chat(str(row["chat_ref"]))
+            except (TelegramBadRequest, TelegramForbiddenError):
+                logging.warning("Channel %s could not be resolved", row["chat_ref"])
+                continue
+            await self.db.set_channel_chat_id(int(row["id"]), chat.id)
+
+        cutoff = (datetime.now(timezone.utc) - CHANNEL_MEMBERS_MAX_AGE).isoformat(timespec="seconds")
+        pruned = await self.db.prune_channel_members(cutoff)
+        if pruned:
+            logging.info("Pruned %s stale channel membership rows", pruned)
+
+    async def _resolve_channel(self, chat: Chat) -> Optional[Any]:
+        row = match_channel(await self.db.list_channels(), chat)
+        if row is not None and row["chat_id"] is None:
+            await self.db.set_channel_chat_id(int(row["id"]), chat.id)
+        return row
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update
+
+from database import AsyncDatabase
+
+
+@dataclass(frozen=True)
+class UserContext:
+    user_id: int
+    is_admin: bool
+    language: str
+    is_registered: bool
+    credits: int
+    pending_payment_id: Optional[int]
+
+    @classmethod
+    def from_row(cls, user_id: int, is_admin: bool, row: Any) -> "UserContext":
+        return cls(
+            user_id=user_id,
+            is_admin=is_admin,
+            language=str(row["language"] or ""),
+            is_registered=bool(row["first_name"] and row["last_name"] and row["phone"] and row["birth_date"]),
+            credits=int(row["credits"]),
+            pending_payment_id=int(row["pending_payment_id"]) if row["pending_payment_id"] is not None else None,
+        )
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self._semaphore:
+            return await handler(event, data)
+
+
+THROTTLED_UPDATE_TYPES = ("message", "edited_message", "callback_query")
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        rate: float,
+        burst: int,
+        max_users: int = 100_000,
+        sweep_interval: float = 60.0,
+        full_sweep_backoff: float = 1.0,
+    ) -> None:
+        self.db = db
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.sweep_interval = sweep_interval
+        self.full_sweep_backoff = full_sweep_backoff
+        self.dropped: Dict[str, int] = {update_type: 0 for update_type in THROTTLED_UPDATE_TYPES}
+        self.evicted = 0
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._last_sweep = time.monotonic()
+        self._next_sweep = self._last_sweep + sweep_interval
+
+    @property
+    def tracked_users(self) -> int:
+        return len(self._buckets)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or not isinstance(event, Update) or event.event_type not in self.dropped:
+            return await handler(event, data)
+        if self.allow(user.id) or await self.db.is_admin(user.id):
+            return await handler(event, data)
+        self.dropped[event.event_type] += 1
+        if event.callback_query is not None:
+            try:
+                await event.callback_query.answer()
+            except TelegramAPIError:
+                pass
+        return None
+
+    def allow(self, user_id: int) -> bool:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        state = self._buckets.get(user_id)
+        if state is None:
+            if len(self._buckets) >= self.max_users:
+                self._make_room(now)
+            state = (self.burst, now)
+        tokens, updated = state
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return False
+        self._buckets[user_id] = (tokens - 1, now)
+        return True
+
+    def _make_room(self, now: float) -> None:
+        if now - self._last_sweep >= self.full_sweep_backoff:
+            self._sweep(now)
+        while len(self._buckets) >= self.max_users:
+            del self._buckets[next(iter(self._buckets))]
+            self.evicted += 1
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        self._next_sweep = now + self.sweep_interval
+        self._buckets = {
+            user_id: (tokens, updated)
+            for user_id, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate < self.burst
+        }
+
+
+class RoleMiddleware(BaseMiddleware):
+    def __init__(self, db: AsyncDatabase) -> None:
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["is_admin"] = user is not None and await self.db.is_admin(user.id)
+        return await handler(event, data)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    def __init__(self, db: AsyncDatabase) -> None:
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            if "user_ctx" in data["handler"].params:
+                raise SkipHandler()
+            return await handler(event, data)
+        row = await self.db.get_user_snapshot(user.id)
+        data["user_ctx"] = UserContext.from_row(user.id, bool(data.get("is_admin")), row)
+        return await handler(event, data)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import CopyMessage, SendDocument, SendMessage, SendPhoto, TelegramMethod
+from aiogram.types import Message
+
+from database import AsyncDatabase, OutboxItem, utc_now
+from fanout import FAN_OUT_LIMIT, fan_out
+
+OUTBOX_METHODS: Dict[str, Type[TelegramMethod]] = {
+    method.__name__: method for method in (SendMessage, SendPhoto, SendDocument, CopyMessage)
+}
+
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest, ValueError)
+
+RefundHandler = Callable[[int], Awaitable[Any]]
+
+
+class Outbox:
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        batch_size: int = 100,
+        poll_interval: float = 5.0,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 600.0,
+        concurrency: int = FAN_OUT_LIMIT,
+    ) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self.on_refund: Optional[RefundHandler] = None
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(
+        self,
+        methods: Iterable[TelegramMethod],
+        link: Optional[Tuple[int, int]] = None,
+        refund: bool = False,
+    ) -> int:
+        items = self.prepare(methods, link, refund)
+        if not items:
+            return 0
+        count = await self.db.enqueue_outbox(items)
+        self.wake()
+        return count
+
+    def prepare(
+        self,
+        methods: Iterable[TelegramMethod],
+        link: Optional[Tuple[int, int]] = None,
+        refund: bool = False,
+    ) -> List[OutboxItem]:
+        link_user_tg_id, link_user_message_id = link or (None, None)
+        refund_user_tg_id = link_user_tg_id if refund else None
+        items: List[OutboxItem] = []
+        for method in methods:
+            name = type(method).__name__
+            if name not in OUTBOX_METHODS:
+                raise ValueError(f"Unsupported outbox method: {name}")
+            payload = method.model_dump_json(exclude_none=True, exclude_defaults=True)
+            items.append(
+                (str(method.chat_id), name, payload, link_user_tg_id, link_user_message_id, refund_user_tg_id)
+            )
+        return items
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def run(self, bot: Bot) -> None:
+        while True:
+            try:
+                delivered = await self.deliver_due(bot)
+            except Exception:
+                logging.exception("Outbox delivery error")
+                delivered = 0
+            if delivered:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def deliver_due(self, bot: Bot) -> int:
+        due = await self.db.list_due_outbox(utc_now(), self.batch_size)
+        deliveries = await fan_out(due, lambda row: self._deliver(bot, row), limit=self.concurrency)
+        for delivery in deliveries:
+            if delivery.error is not None:
+                logging.error("Outbox message %s delivery error: %s", delivery.recipient["id"], delivery.error)
+        return sum(1 for delivery in deliveries if delivery.result)
+
+    async def _deliver(self, bot: Bot, row: Any) -> bool:
+        outbox_id = int(row["id"])
+        try:
+            method = OUTBOX_METHODS[str(row["method"])].model_validate_json(str(row["payload"]))
+            result = await bot(method)
+        except PERMANENT_ERRORS as exc:
+            logging.warning("Outbox message %s to %s dropped: %s", outbox_id, row["chat_id"], exc)
+            await self._fail(outbox_id, str(exc))
+            return True
+        except Exception as exc:
+            attempts = int(row["attempts"]) + 1
+            if attempts >= self.max_attempts:
+                logging.error("Outbox message %s to %s failed after %s attempts", outbox_id, row["chat_id"], attempts)
+                await self._fail(outbox_id, str(exc))
+                return True
+            delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            await self.db.retry_outbox(outbox_id, retry_at.isoformat(timespec="seconds"), str(exc))
+            return False
+        if row["link_user_tg_id"] is None:
+            await self.db.complete_outbox(outbox_id)
+        else:
+            await self.db.complete_outbox(outbox_id, *delivered_message(row, result))
+        return True
+
+    async def _fail(self, outbox_id: int, error: str) -> None:
+        refunded_user_tg_id = await self.db.fail_outbox(outbox_id, error)
+        if refunded_user_tg_id is not None and self.on_refund is not None:
+            await self.on_refund(refunded_user_tg_id)
+
+
+def delivered_message(row: Any, result: Any) -> Tuple[Optional[int], Optional[int]]:
+    if isinstance(result, Message):
+        return result.chat.id, result.message_id
+    chat_id = str(row["chat_id"])
+    if not chat_id.lstrip("-").isdigit():
+        return None, None
+    return int(chat_id), getattr(result, "message_id", None)
@@ -0,0 +1,173 @@
+import inspect
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from database import Database
+
+SAMPLE_CALLS: Dict[str, Tuple[object, ...]] = {
+    "set_setting_if_missing": ("instagram_url", ""),
+    "set_setting": ("suspicious_threshold", "3"),
+    "get_setting": ("instagram_url",),
+    "get_int_setting": ("suspicious_threshold", 3),
+    "settings_cache_stats": (),
+    "ensure_super_admin": (1,),
+    "add_admin": (2,),
+    "is_admin": (1,),
+    "list_admins": (),
+    "remove_admin": (2,),
+    "upsert_user": (10, "user", "User Name"),
+    "total_users": (),
+    "blocked_users": (),
+    "increment_no_payment_attempt": (10,),
+    "reset_no_payment_attempts": (10,),
+    "add_channel": ("@channel", None, "Channel", -1001),
+    "list_channels": (),
+    "channel_list": (),
+    "set_channel_chat_id": (1, -1001),
+    "set_channel_member": (-1001, 10, True),
+    "get_channel_memberships": (10,),
+    "clear_channel_members": (-1002,),
+    "prune_channel_members": ("2000-01-01T00:00:00+00:00",),
+    "remove_channel": (99,),
+    "save_custom_menu": ("Prices", "100"),
+    "list_custom_menus": (),
+    "get_custom_menu_by_button": ("Prices",),
+    "custom_menu_buttons": (),
+    "remove_custom_menu": (99,),
+    "add_card": ("Owner", "8600 0000 0000 0000", True),
+    "list_cards": (),
+    "set_active_card": (1,),
+    "get_active_card": (),
+    "remove_card": (1,),
+    "get_credits": (10,),
+    "add_credits": (10, 1),
+    "consume_credit": (10, 1),
+    "create_payment": (10, "file", "photo", None),
+    "get_payment": (1,),
+    "get_pending_payment": (10,),
+    "update_payment_status": (1, "approved", 1),
+    "payment_stats": (),
+    "save_message_link": (10, 1, 500, 20),
+    "get_message_link": (1, 500),
+    "get_message_link_target": (1, 500),
+    "get_user_for_admin_message": (1, 500),
+    "get_user_message_for_admin_message": (1, 500),
+    "total_user_messages": (),
+    "get_user": (10,),
+    "get_user_profile": (10,),
+    "update_user_first_name": (10, "Ali"),
+    "update_user_last_name": (10, "Valiyev"),
+    "update_user_phone": (10, "+998901234567"),
+    "update_user_birth_date": (10, "1990-02-01"),
+    "get_user_language": (10,),
+    "set_user_language": (10, "lotin"),
+    "is_user_registered": (10,),
+    "get_user_snapshot": (10,),
+    "save_user_registration": (10, "Ali", "Valiyev", "+998901234567", "1990-02-01"),
+    "list_today_birthdays": ("02-01",),
+    "is_birthday_notified": (10, 2024),
+    "mark_birthday_notified": (10, 2024),
+    "list_unnotified_birthdays": ("02-01", 2024),
+    "mark_birthdays_notified": ([10, 11], 2024),
+    "enqueue_birthday_digest": ([("1", "SendMessage", "{}", None, None, None)], [10, 11], 2025),
+    "delete_user_data": (10,),
+    "enqueue_outbox": ([("1", "SendMessage", "{}", 10, 20, 10)],),
+    "list_due_outbox": ("2000-01-01T00:00:00+00:00", 10),
+    "retry_outbox": (1, "2000-01-01T00:00:00+00:00", "error"),
+    "fail_outbox": (1, "error"),
+    "complete_outbox": (1, 1, 501),
+    "outbox_stats": (),
+    "purge_failed_outbox": ("2000-01-01T00:00:00+00:00",),
+    "create_broadcast": (1, 1, 700),
+    "get_broadcast": (1,),
+    "list_running_broadcasts": (),
+    "list_broadcast_recipients": (0, 500),
+    "save_broadcast_progress": (1, 10, 1, 0, [11]),
+    "finish_broadcast": (1, "done"),
+    "list_jobs": (),
+    "save_job": ("birthdays", "birthdays", "{}", "2000-01-01T00:00:00+00:00"),
+    "record_job_run": ("birthdays", "2000-01-02T00:00:00+00:00", "2000-01-01T00:00:00+00:00", 5, None, 0),
+    "delete_job": ("missing",),
+    "sync_caches": (),
+    "get_fsm_record": ("fsm:10:10",),
+    "save_fsm_records": ([("fsm:10:10", "UserStates:waiting_phone", "{}"), ("fsm:11:11", None, "{}")],),
+}
+
+ALLOWED_SCANS: Dict[str, Tuple[str, ...]] = {
+    "list_channels": ("channels",),
+    "add_channel": ("channels",),
+    "set_channel_chat_id": ("channels",),
+    "remove_channel": ("channels",),
+    "list_custom_menus": ("custom_menus",),
+    "save_custom_menu": ("custom_menus",),
+    "remove_custom_menu": ("custom_menus",),
+    "list_cards": ("cards",),
+    "add_card": ("cards",),
+    "get_active_card": ("cards",),
+    "remove_card": ("cards",),
+    "list_jobs": ("jobs",),
+    "list_due_outbox": ("heads",),
+    "sync_caches": ("cache_epochs",),
+    "get_user_snapshot": ("target",),
+    "prune_channel_members": ("channel_members", "channels"),
+}
+
+SKIPPED_METHODS = {"close", "submit_write"}
+
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+
+
+def public_methods() -> List[str]:
+    return [
+        name
+        for name, _ in inspect.getmembers(Database, inspect.isfunction)
+        if not name.startswith("_") and name not in SKIPPED_METHODS
+    ]
+
+
+def find_table_scans(db: Database) -> Dict[str, List[str]]:
+    problems: Dict[str, List[str]] = {}
+    missing = sorted(set(public_methods()) - set(SAMPLE_CALLS))
+    for name in missing:
+        problems[name] = ["no entry in SAMPLE_CALLS"]
+
+    statements: List[str] = []
+    db.conn.set_trace_callback(statements.append)
+    try:
+        for name, args in SAMPLE_CALLS.items():
+            statements.clear()
+            getattr(db, name)(*args)
+            for sql in list(statements):
+                if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                for row in db.conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                    match = FULL_SCAN_RE.match(str(row["detail"]))
+                    if match and match.group(1) not in ALLOWED_SCANS.get(name, ()):
+                        problems.setdefault(name, []).append(f"{row['detail']}: {' '.join(sql.split())}")
+    finally:
+        db.conn.set_trace_callback(None)
+    return problems
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(str(Path(tmp_dir) / "plan_check.db"))
+        try:
+            problems = find_table_scans(db)
+        finally:
+            db.close()
+
+    for name, details in sorted(problems.items()):
+        for detail in details:
+            print(f"{name}: {detail}")
+    if problems:
+        return 1
+    print(f"OK: {len(SAMPLE_CALLS)} Database methods use indexed lookups.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
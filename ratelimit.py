@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    CopyMessages,
+    ForwardMessage,
+    ForwardMessages,
+    SendAnimation,
+    SendAudio,
+    SendDocument,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendSticker,
+    SendVideo,
+    SendVoice,
+    TelegramMethod,
+)
+
+RATE_LIMITED_METHODS = (
+    CopyMessage,
+    CopyMessages,
+    ForwardMessage,
+    ForwardMessages,
+    SendAnimation,
+    SendAudio,
+    SendDocument,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendSticker,
+    SendVideo,
+    SendVoice,
+)
+
+CHAT_BURST = 3
+MAX_CHAT_BUCKETS = 10_000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def is_idle(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        group_rate: float = 20 / 60,
+        max_retries: int = 5,
+    ) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.queue_depth = 0
+        self.retries = 0
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._paused_until = 0.0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        if not isinstance(method, RATE_LIMITED_METHODS):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            await self._wait_turn(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+                logging.warning(
+                    "Flood limit on %s for chat %s, retrying in %ss", type(method).__name__, chat_id, exc.retry_after
+                )
+
+    async def _wait_turn(self, chat_id: Optional[Any]) -> None:
+        self.queue_depth += 1
+        try:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            delay = self._chat_bucket(chat_id).reserve() if chat_id is not None else 0.0
+            if delay > 0:
+                await asyncio.sleep(delay)
+            delay = self.global_bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.queue_depth -= 1
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items() if not value.is_idle()}
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, max(CHAT_BURST * rate, 1))
+            self._chat_buckets[chat_id] = bucket
+        return bucket
@@ -0,0 +1,56 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+ButtonLookup = Callable[[str], Awaitable[Any]]
+
+
+def button_key(text: str) -> str:
+    return text.strip().casefold()
+
+
+class ButtonRouter(Filter):
+    def __init__(self) -> None:
+        self._routes: Dict[str, CallableObject] = {}
+        self._lookup: Optional[ButtonLookup] = None
+        self._lookup_handler: Optional[CallableObject] = None
+
+    def route(self, *texts: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+            callable_object = CallableObject(handler)
+            for text in texts:
+                key = button_key(text)
+                if not key:
+                    continue
+                if key in self._routes:
+                    raise RuntimeError(f"Button {text!r} is already routed")
+                self._routes[key] = callable_object
+            return handler
+
+        return decorator
+
+    def fallback(self, lookup: ButtonLookup) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+            self._lookup = lookup
+            self._lookup_handler = CallableObject(handler)
+            return handler
+
+        return decorator
+
+    async def __call__(self, message: Message) -> Union[bool, Dict[str, Any]]:
+        if not message.text:
+            return False
+        handler = self._routes.get(button_key(message.text))
+        if handler is not None:
+            return {"button_handler": handler}
+        if self._lookup is None:
+            return False
+        match = await self._lookup(message.text.strip())
+        if not match:
+            return False
+        return {"button_handler": self._lookup_handler, "button_match": match}
+
+    async def dispatch(self, message: Message, button_handler: CallableObject, **data: Any) -> Any:
+        return await button_handler.call(message, **data)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Union
+
+from database import AsyncDatabase
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+MAX_MISSED_COUNT = 10_000
+
+
+class Interval:
+    def __init__(self, seconds: float) -> None:
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.period = timedelta(seconds=seconds)
+
+    def first_run(self, now: datetime) -> datetime:
+        return now
+
+    def next_after(self, when: datetime) -> datetime:
+        return when + self.period
+
+
+class DailyAt:
+    def __init__(self, hour: int, minute: int = 0, tz: tzinfo = timezone.utc) -> None:
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError("DailyAt needs a valid hour and minute")
+        self.hour = hour
+        self.minute = minute
+        self.tz = tz
+
+    def first_run(self, now: datetime) -> datetime:
+        return now.astimezone(self.tz).replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+
+    def next_after(self, when: datetime) -> datetime:
+        run_at = self.first_run(when)
+        if run_at <= when:
+            run_at += timedelta(days=1)
+        return run_at
+
+
+Schedule = Union[Interval, DailyAt]
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    missed: int = 0
+    last_duration: float = 0.0
+    total_duration: float = 0.0
+
+
+@dataclass
+class Job:
+    name: str
+    task: str
+    next_run_at: datetime
+    schedule: Optional[Schedule] = None
+    payload: Dict[str, Any] = field(default_factory=dict)
+    missed: int = 0
+
+
+def _utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+class Scheduler:
+    def __init__(self, db: AsyncDatabase) -> None:
+        self.db = db
+        self.stats: Dict[str, JobStats] = {}
+        self._handlers: Dict[str, JobHandler] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._schedules: Dict[str, Schedule] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._loaded = False
+
+    def task(self, name: str, max_concurrency: int = 1) -> Callable[[JobHandler], JobHandler]:
+        def decorator(handler: JobHandler) -> JobHandler:
+            if name in self._handlers:
+                raise RuntimeError(f"Job task {name!r} is already registered")
+            self._handlers[name] = handler
+            self._limits[name] = asyncio.Semaphore(max_concurrency)
+            self.stats[name] = JobStats()
+            return handler
+
+        return decorator
+
+    def every(self, name: str, schedule: Schedule, max_concurrency: int = 1) -> Callable[[JobHandler], JobHandler]:
+        def decorator(handler: JobHandler) -> JobHandler:
+            self.task(name, max_concurrency)(handler)
+            self._schedules[name] = schedule
+            return handler
+
+        return decorator
+
+    async def schedule_once(
+        self,
+        task: str,
+        key: str,
+        run_at: datetime,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        if task not in self._handlers:
+            raise RuntimeError(f"Unknown job task {task!r}")
+        name = f"{task}:{key}"
+        payload = payload or {}
+        await self.db.save_job(name, task, json.dumps(payload, ensure_ascii=False), _utc(run_at))
+        if self._loaded:
+            self._jobs[name] = Job(name, task, run_at, payload=payload)
+            self._wakeup.set()
+        return name
+
+    async def run(self) -> None:
+        await self._load()
+        while True:
+            now = datetime.now(timezone.utc)
+            for job in list(self._jobs.values()):
+                if job.next_run_at <= now and job.name not in self._running:
+                    self._start(job)
+
+            upcoming = [job.next_run_at for job in self._jobs.values() if job.name not in self._running]
+            timeout = max((min(upcoming) - now).total_seconds(), 0) if upcoming else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _load(self) -> None:
+        now = datetime.now(timezone.utc)
+        stored = {str(row["name"]): row for row in await self.db.list_jobs()}
+        for name, schedule in self._schedules.items():
+            row = stored.pop(name, None)
+            if row is None:
+                next_run_at = schedule.first_run(now)
+                await self.db.save_job(name, name, "{}", _utc(next_run_at))
+                self._jobs[name] = Job(name, name, next_run_at, schedule)
+                continue
+            next_run_at = datetime.fromisoformat(str(row["next_run_at"]))
+            job = Job(name, name, next_run_at, schedule, missed=self._count_missed(schedule, next_run_at, now))
+            if job.missed:
+                logging.warning("Job %s missed %s run(s) while the bot was down", name, job.missed)
+            self._jobs[name] = job
+
+        for name, row in stored.items():
+            task = str(row["task"])
+            if task in self._schedules:
+                continue
+            if task not in self._handlers:
+                logging.warning("Job %s has no registered task %s, skipping", name, task)
+                continue
+            next_run_at = datetime.fromisoformat(str(row["next_run_at"]))
+            self._jobs[name] = Job(name, task, next_run_at, payload=json.loads(row["payload"]))
+        self._loaded = True
+
+    def _count_missed(self, schedule: Schedule, next_run_at: datetime, now: datetime) -> int:
+        missed = 0
+        when = schedule.next_after(next_run_at)
+        while when <= now and missed < MAX_MISSED_COUNT:
+            missed += 1
+            when = schedule.next_after(when)
+        return missed
+
+    def _start(self, job: Job) -> None:
+        self._running.add(job.name)
+        task = asyncio.create_task(self._execute(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: Job) -> None:
+        stats = self.stats[job.task]
+        started_at = datetime.now(timezone.utc)
+        error: Optional[str] = None
+        try:
+            async with self._limits[job.task]:
+                started = time.monotonic()
+                try:
+                    await self._handlers[job.task](job.payload)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    logging.exception("Job %s failed", job.name)
+                    error = str(exc) or type(exc).__name__
+                duration = time.monotonic() - started
+
+            stats.runs += 1
+            stats.failures += 1 if error else 0
+            stats.missed += job.missed
+            stats.last_duration = duration
+            stats.total_duration += duration
+
+            if job.schedule is None:
+                await self.db.delete_job(job.name)
+                self._jobs.pop(job.name, None)
+                return
+            job.next_run_at = job.schedule.next_after(datetime.now(timezone.utc))
+            await self.db.record_job_run(
+                job.name,
+                _utc(job.next_run_at),
+                _utc(started_at),
+                int(duration * 1000),
+                error,
+                job.missed,
+            )
+            job.missed = 0
+        finally:
+            self._running.discard(job.name)
+            self._wakeup.set()
@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import queue
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from database import AsyncDatabase
+
+CACHE_SYNC_INTERVAL = 1.0
+OUTBOX_POLL_INTERVAL = 0.25
+UPDATE_BATCH_SIZE = 100
+
+WorkerTarget = Callable[[int, Any], None]
+ShardedUpdate = Tuple[Optional[int], str]
+
+
+def shard_for(user_id: Optional[int], shards: int) -> int:
+    if user_id is None:
+        return 0
+    return user_id % shards
+
+
+def update_user_id(update: Update, data: Dict[str, Any]) -> Optional[int]:
+    if update.chat_member is not None:
+        return update.chat_member.new_chat_member.user.id
+    user = data.get("event_from_user")
+    return user.id if user else None
+
+
+class ShardRouter(BaseMiddleware):
+    def __init__(self, queues: List[Any]) -> None:
+        self.queues = queues
+        self.routed = [0] * len(queues)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        user_id = update_user_id(event, data)
+        shard = shard_for(user_id, len(self.queues))
+        self.queues[shard].put_nowait((user_id, event.model_dump_json(exclude_unset=True)))
+        self.routed[shard] += 1
+        return None
+
+
+class WorkerPool:
+    def __init__(self, size: int, target: WorkerTarget, check_interval: float = 1.0) -> None:
+        self._context = multiprocessing.get_context("spawn")
+        self.size = size
+        self.target = target
+        self.check_interval = check_interval
+        self.queues = [self._context.Queue() for _ in range(size)]
+        self.restarts = 0
+        self._processes: List[Any] = [None] * size
+
+    def start(self) -> None:
+        for index in range(self.size):
+            self._spawn(index)
+
+    async def supervise(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logging.error("Worker %s exited with code %s, restarting", index, process.exitcode)
+                    self.restarts += 1
+                    self._spawn(index)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        processes, self._processes = self._processes, [None] * self.size
+        for updates in self.queues:
+            updates.put(None)
+        loop = asyncio.get_running_loop()
+        for process in processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logging.warning("Worker %s did not stop in %ss, terminating", process.name, timeout)
+                process.terminate()
+        for updates in self.queues:
+            updates.close()
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(index, self.queues[index]),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+
+def _next_batch(updates: Any) -> List[Optional[ShardedUpdate]]:
+    batch = [updates.get()]
+    while batch[-1] is not None and len(batch) < UPDATE_BATCH_SIZE:
+        try:
+            batch.append(updates.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+async def _feed(dp: Dispatcher, bot: Bot, raw: str) -> None:
+    try:
+        await dp.feed_update(bot, Update.model_validate_json(raw, context={"bot": bot}))
+    except Exception:
+        logging.exception("Failed to process sharded update")
+
+
+async def _feed_after(previous: Optional[asyncio.Task], dp: Dispatcher, bot: Bot, raw: str) -> None:
+    if previous is not None:
+        await asyncio.wait([previous])
+    await _feed(dp, bot, raw)
+
+
+def _release_tail(tails: Dict[Any, asyncio.Task], key: Any, task: asyncio.Task) -> None:
+    if tails.get(key) is task:
+        del tails[key]
+
+
+async def consume_updates(updates: Any, dp: Dispatcher, bot: Bot) -> None:
+    loop = asyncio.get_running_loop()
+    tails: Dict[Any, asyncio.Task] = {}
+    running = True
+    while running:
+        for item in await loop.run_in_executor(None, _next_batch, updates):
+            if item is None:
+                running = False
+                break
+            user_id, raw = item
+            key = user_id if user_id is not None else object()
+            task = asyncio.create_task(_feed_after(tails.get(key), dp, bot, raw))
+            tails[key] = task
+            task.add_done_callback(functools.partial(_release_tail, tails, key))
+    await asyncio.gather(*tails.values(), return_exceptions=True)
+
+
+async def sync_caches(db: AsyncDatabase, interval: float = CACHE_SYNC_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stale = await db.sync_caches()
+        except Exception:
+            logging.exception("Cache sync failed")
+            continue
+        if stale:
+            logging.info("Reloaded caches changed by other processes: %s", ", ".join(stale))
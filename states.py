@@ -21,6 +21,8 @@ class AdminStates(StatesGroup):
     waiting_custom_menu_text = State()
     waiting_custom_menu_delete = State()
 
+    waiting_broadcast_message = State()
+
 
 class UserStates(StatesGroup):
     waiting_first_name = State()
@@ -0,0 +1,13 @@
+import asyncio
+from typing import Iterator
+
+import pytest
+
+from database import AsyncDatabase, Database
+
+
+@pytest.fixture
+def db(tmp_path) -> Iterator[AsyncDatabase]:
+    async_db = AsyncDatabase(Database(str(tmp_path / "test.db")))
+    yield async_db
+    asyncio.run(async_db.close())
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from database import AsyncDatabase, Database
+from main import UZ_TZ, process_today_birthdays
+from outbox import Outbox
+
+NOW = datetime(2026, 3, 14, 9, 0, tzinfo=UZ_TZ)
+
+
+async def add_birthday_user(db: AsyncDatabase, tg_id: int) -> None:
+    await db.upsert_user(tg_id, None, f"User {tg_id}")
+    await db.update_user_birth_date(tg_id, "1990-03-14")
+
+
+def test_digest_is_queued_and_marked_once(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        await db.add_admin(1)
+        await add_birthday_user(db, 7)
+        outbox = Outbox(db)
+
+        assert await process_today_birthdays(outbox, db, NOW) == 1
+        assert await process_today_birthdays(outbox, db, NOW) == 0
+        assert await db.outbox_stats() == {"pending": 1}
+
+    asyncio.run(scenario())
+
+
+def test_failed_enqueue_leaves_users_unnotified(db: AsyncDatabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    def broken_enqueue(self: Database, items: list) -> int:
+        raise RuntimeError("disk full")
+
+    async def scenario() -> None:
+        await db.add_admin(1)
+        await add_birthday_user(db, 7)
+        monkeypatch.setattr(Database, "enqueue_outbox", broken_enqueue)
+
+        with pytest.raises(RuntimeError):
+            await process_today_birthdays(Outbox(db), db, NOW)
+        assert [int(row["tg_id"]) for row in await db.list_unnotified_birthdays("03-14", 2026)] == [7]
+
+    asyncio.run(scenario())
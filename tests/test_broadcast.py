@@ -0,0 +1,76 @@
+import asyncio
+from collections import Counter
+from typing import Any, List
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import CopyMessage
+
+from broadcast import Broadcaster
+from database import AsyncDatabase
+
+
+class BroadcastBot:
+    def __init__(self) -> None:
+        self.copies: Counter = Counter()
+        self.reports: List[str] = []
+
+    async def copy_message(self, chat_id: int, from_chat_id: int, message_id: int) -> Any:
+        if chat_id == 5:
+            raise ConnectionError("connection reset")
+        if chat_id == 6:
+            method = CopyMessage(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id)
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+        self.copies[chat_id] += 1
+        return None
+
+    async def send_message(self, chat_id: int, text: str) -> Any:
+        self.reports.append(text)
+        return None
+
+
+async def wait_until_finished(db: AsyncDatabase, broadcast_id: int) -> Any:
+    for _ in range(200):
+        broadcast = await db.get_broadcast(broadcast_id)
+        if broadcast["status"] != "running":
+            return broadcast
+        await asyncio.sleep(0.05)
+    raise AssertionError("broadcast did not finish")
+
+
+def test_failed_recipient_does_not_resend_to_others(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        for tg_id in range(1, 11):
+            await db.upsert_user(tg_id, None, f"User {tg_id}")
+        bot = BroadcastBot()
+        broadcaster = Broadcaster(db, batch_size=4, retry_delay=0.01)
+
+        broadcast_id = await broadcaster.start(bot, 100, 100, 1)
+        broadcast = await wait_until_finished(db, broadcast_id)
+
+        assert bot.copies == {tg_id: 1 for tg_id in range(1, 11) if tg_id not in (5, 6)}
+        assert (broadcast["sent"], broadcast["failed"], broadcast["blocked"]) == (8, 1, 1)
+        assert len(bot.reports) == 1
+
+    asyncio.run(scenario())
+
+
+def test_worker_broadcast_is_delivered_by_the_coordinator(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        for tg_id in (1, 2):
+            await db.upsert_user(tg_id, None, f"User {tg_id}")
+        bot = BroadcastBot()
+        worker = Broadcaster(db, deliver=False)
+        coordinator = Broadcaster(db)
+
+        broadcast_id = await worker.start(bot, 100, 100, 1)
+        await asyncio.sleep(0.05)
+        assert not bot.copies
+
+        watch = asyncio.create_task(coordinator.watch(bot, interval=0.01))
+        try:
+            await wait_until_finished(db, broadcast_id)
+        finally:
+            watch.cancel()
+        assert bot.copies == {1: 1, 2: 1}
+
+    asyncio.run(scenario())
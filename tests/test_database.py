@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+from database import AsyncDatabase, Database, _in_memory, _writes
+
+
+class ProbeDatabase(Database):
+    @_in_memory
+    def cached_thread(self) -> str:
+        return threading.current_thread().name
+
+    @_writes
+    def writer_thread(self) -> str:
+        return threading.current_thread().name
+
+    def reader_thread(self) -> str:
+        return threading.current_thread().name
+
+
+def test_async_database_dispatches_by_method_kind(tmp_path) -> None:
+    async def scenario() -> None:
+        db = AsyncDatabase(ProbeDatabase(str(tmp_path / "test.db")))
+        try:
+            assert await db.cached_thread() == threading.current_thread().name
+            assert await db.writer_thread() == "db-writer"
+            assert (await db.reader_thread()).startswith("db_")
+            assert db.db.writer_thread() == "db-writer"
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_writes_share_a_commit(tmp_path) -> None:
+    async def scenario() -> None:
+        db = AsyncDatabase(Database(str(tmp_path / "test.db"), commit_interval=0.05))
+        commits = []
+        try:
+            db.db.conn.set_trace_callback(lambda statement: commits.append(statement) if statement == "COMMIT" else None)
+            await asyncio.gather(*(db.upsert_user(tg_id, None, f"User {tg_id}") for tg_id in range(1, 21)))
+            db.db.conn.set_trace_callback(None)
+            assert await db.total_users() == 20
+        finally:
+            await db.close()
+        assert len(commits) == 1
+
+    asyncio.run(scenario())
+
+
+def test_settings_cache_changes_only_when_the_write_commits(tmp_path) -> None:
+    db = Database(str(tmp_path / "test.db"), commit_interval=0.05)
+    seen_inside = []
+
+    def set_then_fail() -> None:
+        db.set_setting("clinic_phone", "+998 90 000 00 00")
+        seen_inside.append(db.get_setting("clinic_phone", "unset"))
+        raise ValueError("abort")
+
+    def set_and_keep() -> None:
+        db.set_setting("clinic_address", "Toshkent")
+        seen_inside.append(db.get_setting("clinic_address", "unset"))
+
+    try:
+        failed = db.submit_write(set_then_fail)
+        kept = db.submit_write(set_and_keep)
+        assert isinstance(failed.exception(), ValueError)
+        assert kept.result() is None
+
+        assert seen_inside == ["unset", "unset"]
+        assert db.get_setting("clinic_phone", "unset") == "unset"
+        assert db.get_setting("clinic_address") == "Toshkent"
+        assert db._fetchone("SELECT value FROM settings WHERE key = 'clinic_phone'") is None
+    finally:
+        db.close()
+
+
+def test_admin_cache_follows_committed_changes_only(tmp_path) -> None:
+    db = Database(str(tmp_path / "test.db"), commit_interval=0.05)
+    db.add_admin(1)
+
+    def promote_then_fail() -> None:
+        db.add_admin(2)
+        db.remove_admin(1)
+        raise ValueError("abort")
+
+    try:
+        failed = db.submit_write(promote_then_fail)
+        kept = db.submit_write(db.add_admin, 3)
+        assert isinstance(failed.exception(), ValueError)
+        assert kept.result() is None
+
+        assert db.list_admins() == [1, 3]
+        assert db.is_admin(1) and not db.is_admin(2)
+        assert db._load_admin_ids() == frozenset({1, 3})
+        assert db.remove_admin(1) == 1
+        assert not db.is_admin(1)
+    finally:
+        db.close()
@@ -0,0 +1,46 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import SQLiteStorage
+
+
+def storage_key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_close_flushes_pending_writes(db) -> None:
+    async def scenario() -> None:
+        storage = SQLiteStorage(db, flush_interval=60)
+        await storage.set_state(storage_key(7), "UserStates:first_name")
+        await storage.set_data(storage_key(7), {"first_name": "Ali"})
+        await storage.set_state(storage_key(8), "UserStates:phone")
+        await storage.close()
+
+        storage = SQLiteStorage(db, flush_interval=60)
+        await storage.set_state(storage_key(8), None)
+        await storage.set_data(storage_key(8), {})
+        assert await db.get_fsm_record(storage.key_builder.build(storage_key(8))) is not None
+        await storage.close()
+
+        reopened = SQLiteStorage(db)
+        assert await reopened.get_state(storage_key(7)) == "UserStates:first_name"
+        assert await reopened.get_data(storage_key(7)) == {"first_name": "Ali"}
+        assert await reopened.get_state(storage_key(8)) is None
+        assert await db.get_fsm_record(reopened.key_builder.build(storage_key(8))) is None
+        await reopened.close()
+
+    asyncio.run(scenario())
+
+
+def test_writes_stay_in_memory_until_flushed(db) -> None:
+    async def scenario() -> None:
+        storage = SQLiteStorage(db, flush_interval=60)
+        await storage.set_state(storage_key(7), "UserStates:phone")
+        assert await storage.get_state(storage_key(7)) == "UserStates:phone"
+        assert await db.get_fsm_record(storage.key_builder.build(storage_key(7))) is None
+        await storage.flush()
+        assert (await db.get_fsm_record(storage.key_builder.build(storage_key(7))))["state"] == "UserStates:phone"
+        await storage.close()
+
+    asyncio.run(scenario())
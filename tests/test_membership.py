@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, List
+
+from aiogram import Bot
+from aiogram.methods import GetChatMember, TelegramMethod
+from aiogram.types import ChatMemberLeft, ChatMemberMember, User
+
+import membership
+from membership import MembershipCache, SubscriptionChecker
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class MembershipBot(Bot):
+    def __init__(self, *members: str) -> None:
+        super().__init__("123:abc")
+        self.members = set(members)
+        self.calls: List[TelegramMethod] = []
+
+    async def __call__(self, method: TelegramMethod, request_timeout: Any = None) -> Any:
+        self.calls.append(method)
+        user = User(id=method.user_id, is_bot=False, first_name="User")
+        if method.chat_id in self.members:
+            return ChatMemberMember(user=user)
+        return ChatMemberLeft(user=user)
+
+
+def test_positive_and_negative_entries_expire_on_their_own_ttl(monkeypatch) -> None:
+    clock = Clock()
+    monkeypatch.setattr(membership.time, "monotonic", clock)
+    cache = MembershipCache(positive_ttl=300, negative_ttl=30)
+    cache.set(7, "@joined", True)
+    cache.set(7, "@missing", False)
+
+    clock.now += 29
+    assert cache.get(7, "@joined") is True
+    assert cache.get(7, "@missing") is False
+
+    clock.now += 1
+    assert cache.get(7, "@joined") is True
+    assert cache.get(7, "@missing") is None
+
+    clock.now += 270
+    assert cache.get(7, "@joined") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_checker_reuses_cached_answers_until_they_expire(monkeypatch) -> None:
+    async def scenario() -> None:
+        clock = Clock()
+        monkeypatch.setattr(membership.time, "monotonic", clock)
+        bot = MembershipBot("@joined")
+        checker = SubscriptionChecker(None, MembershipCache(positive_ttl=300, negative_ttl=30))
+        channels = [{"chat_ref": "@joined", "chat_id": None}, {"chat_ref": "@missing", "chat_id": None}]
+
+        assert await checker.missing_channels(bot, 7, channels) == ["@missing"]
+        assert await checker.missing_channels(bot, 7, channels) == ["@missing"]
+        assert checker.live_checks == 2
+
+        bot.members.add("@missing")
+        clock.now += 31
+        assert await checker.missing_channels(bot, 7, channels) == []
+        assert checker.live_checks == 3
+        assert [method.chat_id for method in bot.calls if isinstance(method, GetChatMember)] == [
+            "@joined",
+            "@missing",
+            "@missing",
+        ]
+        await bot.session.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+import sqlite3
+
+from database import MIGRATIONS, Database
+
+
+def legacy_database(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tg_id INTEGER NOT NULL UNIQUE,
+            username TEXT,
+            full_name TEXT,
+            no_payment_attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE admins (tg_id INTEGER PRIMARY KEY);
+        CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE message_links (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_tg_id INTEGER NOT NULL,
+            admin_chat_id INTEGER NOT NULL,
+            admin_message_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        INSERT INTO users(tg_id, username, full_name, created_at) VALUES (7, 'old', 'Old User', '2024-01-01');
+        INSERT INTO admins(tg_id) VALUES (42);
+        INSERT INTO settings(key, value) VALUES ('instagram_url', 'https://instagram.com/clinic');
+        INSERT INTO message_links(user_tg_id, admin_chat_id, admin_message_id, created_at)
+        VALUES (7, 42, 100, '2024-01-01');
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+def columns(db: Database, table_name: str) -> set:
+    return {str(row["name"]) for row in db.conn.execute(f"PRAGMA table_info({table_name})")}
+
+
+def test_upgrades_a_legacy_database_and_keeps_its_data(tmp_path) -> None:
+    path = str(tmp_path / "legacy.db")
+    legacy_database(path)
+
+    db = Database(path)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert {"language", "first_name", "phone", "birth_date", "blocked_at"} <= columns(db, "users")
+        assert "user_message_id" in columns(db, "message_links")
+        assert "refund_user_tg_id" in columns(db, "outbox")
+        assert db.get_user(7)["full_name"] == "Old User"
+        assert db.is_admin(42)
+        assert db.get_setting("instagram_url") == "https://instagram.com/clinic"
+        assert db.get_setting("suspicious_threshold") == "3"
+        assert db.get_user_for_admin_message(42, 100) == 7
+    finally:
+        db.close()
+
+
+def test_resumes_from_the_recorded_version(tmp_path) -> None:
+    path = str(tmp_path / "partial.db")
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    for number, migration in enumerate(MIGRATIONS[:4], start=1):
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+    conn.execute("UPDATE settings SET value = '-100' WHERE key = 'inbox_chat_id'")
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert db.get_setting("inbox_chat_id") == "-100"
+        assert db.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+    finally:
+        db.close()
+    Database(path).close()
@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, List
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import CopyMessage, SendMessage, TelegramMethod
+
+from database import AsyncDatabase
+from outbox import Outbox
+
+
+class RecordingBot:
+    def __init__(self) -> None:
+        self.sent: List[TelegramMethod] = []
+
+    async def __call__(self, method: TelegramMethod) -> Any:
+        self.sent.append(method)
+        return True
+
+
+def test_backed_off_chat_does_not_block_other_chats(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        outbox = Outbox(db)
+        await outbox.enqueue(SendMessage(chat_id=-100, text=f"queued {n}") for n in range(120))
+        for row in await db.list_due_outbox("9999-12-31T00:00:00+00:00", 200):
+            await db.retry_outbox(int(row["id"]), "9999-01-01T00:00:00+00:00", "timeout")
+        await outbox.enqueue([SendMessage(chat_id=42, text="new")])
+
+        bot = RecordingBot()
+        assert await outbox.deliver_due(bot) == 1
+        assert [(method.chat_id, method.text) for method in bot.sent] == [(42, "new")]
+        assert await db.outbox_stats() == {"pending": 120}
+
+    asyncio.run(scenario())
+
+
+def test_delivers_only_the_oldest_row_of_each_chat(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        outbox = Outbox(db)
+        await outbox.enqueue(
+            [SendMessage(chat_id=1, text="a1"), SendMessage(chat_id=2, text="b1"), SendMessage(chat_id=1, text="a2")]
+        )
+        bot = RecordingBot()
+        await outbox.deliver_due(bot)
+        await outbox.deliver_due(bot)
+        assert [method.text for method in bot.sent] == ["a1", "b1", "a2"]
+
+    asyncio.run(scenario())
+
+
+class FailingBot(RecordingBot):
+    def __init__(self, failing_chats: List[int]) -> None:
+        super().__init__()
+        self.failing_chats = failing_chats
+
+    async def __call__(self, method: TelegramMethod) -> Any:
+        if method.chat_id in self.failing_chats:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+        return await super().__call__(method)
+
+
+def forward(chat_ids: List[int]) -> List[TelegramMethod]:
+    methods: List[TelegramMethod] = []
+    for chat_id in chat_ids:
+        methods.append(SendMessage(chat_id=chat_id, text="head"))
+        methods.append(CopyMessage(chat_id=chat_id, from_chat_id=7, message_id=70))
+    return methods
+
+
+async def deliver_all(outbox: Outbox, bot: RecordingBot) -> None:
+    while await outbox.deliver_due(bot):
+        pass
+
+
+def test_refunds_credit_when_no_admin_receives_the_message(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        outbox = Outbox(db)
+        refunded: List[int] = []
+
+        async def on_refund(user_tg_id: int) -> None:
+            refunded.append(user_tg_id)
+
+        outbox.on_refund = on_refund
+        await outbox.enqueue(forward([1, 2]), link=(7, 70), refund=True)
+        await deliver_all(outbox, FailingBot([1, 2]))
+
+        assert refunded == [7]
+        assert await db.get_credits(7) == 1
+
+    asyncio.run(scenario())
+
+
+def test_keeps_credit_when_one_admin_receives_the_message(db: AsyncDatabase) -> None:
+    async def scenario() -> None:
+        outbox = Outbox(db)
+        refunded: List[int] = []
+
+        async def on_refund(user_tg_id: int) -> None:
+            refunded.append(user_tg_id)
+
+        outbox.on_refund = on_refund
+        await outbox.enqueue(forward([1, 2]), link=(7, 70), refund=True)
+        await deliver_all(outbox, FailingBot([1]))
+
+        assert refunded == []
+        assert await db.get_credits(7) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+from database import Database
+from query_plan_check import find_table_scans
+
+
+def test_database_methods_use_indexed_lookups(tmp_path: Path) -> None:
+    db = Database(str(tmp_path / "plan_check.db"))
+    try:
+        assert find_table_scans(db) == {}
+    finally:
+        db.close()
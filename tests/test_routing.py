@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, List, Optional
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+
+from routing import ButtonRouter
+
+
+def text_update(update_id: int, text: str, bot: Bot) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": 7, "type": "private"},
+                "from": {"id": 7, "is_bot": False, "first_name": "User"},
+                "text": text,
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+def test_exact_routes_win_over_the_fallback_lookup() -> None:
+    async def scenario() -> None:
+        bot = Bot("123:abc")
+        dp = Dispatcher()
+        buttons = ButtonRouter()
+        dp.message.register(buttons.dispatch, buttons)
+        handled: List[Any] = []
+        lookups: List[str] = []
+
+        async def lookup(text: str) -> Optional[str]:
+            lookups.append(text)
+            return f"menu:{text}" if text in ("Profil", "Narxlar") else None
+
+        @buttons.route("Profil", "Профиль")
+        async def profile(message: Message) -> None:
+            handled.append(("profile", message.text))
+
+        @buttons.fallback(lookup)
+        async def custom_menu(message: Message, button_match: str) -> None:
+            handled.append(("custom", button_match))
+
+        @dp.message()
+        async def anything_else(message: Message) -> None:
+            handled.append(("other", message.text))
+
+        for update_id, text in enumerate(["  profil ", "Профиль", "Narxlar", "salom"]):
+            await dp.feed_update(bot, text_update(update_id, text, bot))
+        await bot.session.close()
+
+        assert handled == [
+            ("profile", "  profil "),
+            ("profile", "Профиль"),
+            ("custom", "menu:Narxlar"),
+            ("other", "salom"),
+        ]
+        assert lookups == ["Narxlar", "salom"]
+
+    asyncio.run(scenario())
+
+
+def test_rejects_a_button_routed_twice() -> None:
+    buttons = ButtonRouter()
+
+    @buttons.route("Profil")
+    async def profile(message: Message) -> None:
+        pass
+
+    with pytest.raises(RuntimeError):
+        buttons.route(" PROFIL")(profile)
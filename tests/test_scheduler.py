@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from scheduler import MAX_MISSED_COUNT, DailyAt, Interval, Scheduler, _utc
+
+UZ_TZ = timezone(timedelta(hours=5))
+
+
+def test_counts_runs_missed_while_the_bot_was_down(db) -> None:
+    async def scenario() -> None:
+        now = datetime.now(timezone.utc)
+        await db.save_job("ping", "ping", "{}", _utc(now - timedelta(seconds=210)))
+        scheduler = Scheduler(db)
+        calls: List[Dict[str, Any]] = []
+        done = asyncio.Event()
+
+        @scheduler.every("ping", Interval(60))
+        async def ping(payload: Dict[str, Any]) -> None:
+            calls.append(payload)
+            done.set()
+
+        runner = asyncio.create_task(scheduler.run())
+        await asyncio.wait_for(done.wait(), timeout=5)
+        while scheduler._running:
+            await asyncio.sleep(0.01)
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await scheduler.stop()
+
+        assert len(calls) == 1
+        assert scheduler.stats["ping"].runs == 1
+        assert scheduler.stats["ping"].missed == 3
+        row = (await db.list_jobs())[0]
+        assert (row["runs"], row["missed"], row["failures"]) == (1, 3, 0)
+        assert datetime.fromisoformat(row["next_run_at"]) > now + timedelta(seconds=50)
+
+    asyncio.run(scenario())
+
+
+def test_counts_missed_daily_runs_in_the_schedule_timezone(db) -> None:
+    async def scenario() -> None:
+        scheduler = Scheduler(db)
+        schedule = DailyAt(9, tz=UZ_TZ)
+        next_run_at = datetime(2026, 3, 1, 9, 0, tzinfo=UZ_TZ)
+
+        assert scheduler._count_missed(schedule, next_run_at, datetime(2026, 3, 1, 8, 0, tzinfo=UZ_TZ)) == 0
+        assert scheduler._count_missed(schedule, next_run_at, datetime(2026, 3, 4, 3, 59, tzinfo=timezone.utc)) == 2
+        assert scheduler._count_missed(schedule, next_run_at, datetime(2026, 3, 4, 4, 0, tzinfo=timezone.utc)) == 3
+        assert scheduler._count_missed(Interval(1), next_run_at, next_run_at + timedelta(days=1)) == MAX_MISSED_COUNT
+
+    asyncio.run(scenario())
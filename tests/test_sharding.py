@@ -0,0 +1,51 @@
+import asyncio
+import queue
+from typing import List, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+
+from sharding import ShardRouter, consume_updates
+
+
+def make_update(update_id: int, user_id: int, text: str, bot: Bot) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+                "text": text,
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+def test_updates_of_one_user_are_handled_in_order() -> None:
+    async def scenario() -> None:
+        bot = Bot("123:abc")
+        updates: "queue.Queue" = queue.Queue()
+        front = Dispatcher()
+        front.update.outer_middleware(ShardRouter([updates]))
+        for n in range(6):
+            await front.feed_update(bot, make_update(n, 10 + n % 2, str(n), bot))
+        updates.put(None)
+
+        handled: List[Tuple[int, str]] = []
+        worker = Dispatcher()
+
+        @worker.message()
+        async def slow_first(message: Message) -> None:
+            await asyncio.sleep(0.05 if message.text in ("0", "1") else 0)
+            handled.append((message.from_user.id, message.text))
+
+        await consume_updates(updates, worker, bot)
+        await bot.session.close()
+
+        assert [text for user_id, text in handled if user_id == 10] == ["0", "2", "4"]
+        assert [text for user_id, text in handled if user_id == 11] == ["1", "3", "5"]
+
+    asyncio.run(scenario())
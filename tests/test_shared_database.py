@@ -0,0 +1,73 @@
+import multiprocessing
+from pathlib import Path
+from typing import Any
+
+from database import Database
+
+WRITES_PER_PROCESS = 150
+
+
+def mixed_writes(path: str, worker: int, results: Any) -> None:
+    db = Database(path, mode="wal", commit_interval=0.001)
+    failures = 0
+    try:
+        for n in range(WRITES_PER_PROCESS):
+            tg_id = worker * 1000 + n
+            jobs = [
+                db.submit_write(db.save_custom_menu, f"Menu {worker}-{n % 5}", f"text {n}"),
+                db.submit_write(db.add_card, f"Owner {worker}", f"8600{tg_id:012d}", n % 3 == 0),
+                db.submit_write(db.add_credits, tg_id, 2),
+                db.submit_write(db.consume_credit, tg_id, 1),
+                db.submit_write(db.set_setting, f"worker_{worker}", str(n)),
+            ]
+            for job in jobs:
+                try:
+                    job.result()
+                except Exception:
+                    failures += 1
+    finally:
+        db.close()
+    results.put(failures)
+
+
+def test_concurrent_writers_on_one_wal_file_do_not_fail(tmp_path: Path) -> None:
+    path = str(tmp_path / "shared.db")
+    Database(path, mode="wal").close()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=mixed_writes, args=(path, worker, results)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    failures = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+
+    assert failures == [0, 0, 0, 0]
+    db = Database(path, mode="wal")
+    try:
+        assert all(db.get_credits(worker * 1000 + n) == 1 for worker in range(4) for n in range(WRITES_PER_PROCESS))
+    finally:
+        db.close()
+
+
+def test_sync_caches_picks_up_changes_from_another_connection(tmp_path: Path) -> None:
+    path = str(tmp_path / "shared.db")
+    writer = Database(path, mode="wal")
+    reader = Database(path, mode="wal")
+    try:
+        writer.set_setting("instagram_url", "https://instagram.com/clinic")
+        writer.add_admin(42)
+        writer.save_custom_menu("Manzil", "Toshkent")
+
+        assert reader.get_setting("instagram_url") == ""
+        assert set(reader.sync_caches()) == {"settings", "admins", "custom_menus"}
+        assert reader.get_setting("instagram_url") == "https://instagram.com/clinic"
+        assert reader.is_admin(42)
+        assert reader.get_custom_menu_by_button("Manzil")["response_text"] == "Toshkent"
+
+        reader.upsert_user(7, None, "User")
+        assert writer.sync_caches() == ()
+        assert reader.sync_caches() == ()
+    finally:
+        writer.close()
+        reader.close()
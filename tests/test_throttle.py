@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, Dict, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import AnswerCallbackQuery, TelegramMethod
+from aiogram.types import CallbackQuery, Message, Update
+
+from middlewares import ThrottleMiddleware
+
+
+class AdminList:
+    def __init__(self, *admin_ids: int) -> None:
+        self.admin_ids = admin_ids
+
+    async def is_admin(self, tg_id: int) -> bool:
+        return tg_id in self.admin_ids
+
+
+class RecordingBot(Bot):
+    def __init__(self) -> None:
+        super().__init__("123:abc")
+        self.calls: List[TelegramMethod] = []
+
+    async def __call__(self, method: TelegramMethod, request_timeout: Any = None) -> Any:
+        self.calls.append(method)
+        return True
+
+
+def user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": "User"}
+
+
+def message_update(update_id: int, user_id: int, bot: Bot) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": user(user_id),
+                "text": "spam",
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+def callback_update(update_id: int, user_id: int, bot: Bot) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": user(user_id),
+                "chat_instance": "chat",
+                "data": "tap",
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+def test_drops_messages_over_the_burst_but_not_from_admins() -> None:
+    async def scenario() -> None:
+        bot = RecordingBot()
+        dp = Dispatcher()
+        throttle = ThrottleMiddleware(AdminList(1), rate=0.01, burst=3)
+        dp.update.outer_middleware(throttle)
+        handled: List[int] = []
+
+        @dp.message()
+        async def on_message(message: Message) -> None:
+            handled.append(message.from_user.id)
+
+        for n in range(10):
+            await dp.feed_update(bot, message_update(2 * n, 7, bot))
+            await dp.feed_update(bot, message_update(2 * n + 1, 1, bot))
+        await bot.session.close()
+
+        assert handled.count(7) == 3
+        assert handled.count(1) == 10
+        assert throttle.dropped["message"] == 7
+
+    asyncio.run(scenario())
+
+
+def test_answers_dropped_callback_queries() -> None:
+    async def scenario() -> None:
+        bot = RecordingBot()
+        dp = Dispatcher()
+        throttle = ThrottleMiddleware(AdminList(), rate=0.01, burst=2)
+        dp.update.outer_middleware(throttle)
+        handled: List[str] = []
+
+        @dp.callback_query()
+        async def on_callback(callback: CallbackQuery) -> None:
+            handled.append(callback.id)
+
+        for n in range(5):
+            await dp.feed_update(bot, callback_update(n, 7, bot))
+        await bot.session.close()
+
+        assert handled == ["0", "1"]
+        assert throttle.dropped["callback_query"] == 3
+        answered = [method.callback_query_id for method in bot.calls if isinstance(method, AnswerCallbackQuery)]
+        assert answered == ["2", "3", "4"]
+
+    asyncio.run(scenario())
+
+
+class CountingThrottle(ThrottleMiddleware):
+    sweeps = 0
+
+    def _sweep(self, now: float) -> None:
+        self.sweeps += 1
+        super()._sweep(now)
+
+
+def test_full_table_evicts_oldest_bucket_without_sweeping_every_call() -> None:
+    throttle = CountingThrottle(AdminList(), rate=0.01, burst=3, max_users=3, full_sweep_backoff=60.0)
+    for user_id in range(100, 200):
+        assert throttle.allow(user_id)
+
+    assert throttle.tracked_users == 3
+    assert throttle.evicted == 97
+    assert throttle.sweeps == 0
+    assert list(throttle._buckets) == [197, 198, 199]
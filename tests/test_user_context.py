@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+
+from middlewares import UserContext, UserContextMiddleware
+
+
+def message_update(update_id: int, sender: Optional[Dict[str, Any]], bot: Bot) -> Update:
+    message: Dict[str, Any] = {
+        "message_id": update_id,
+        "date": 0,
+        "chat": {"id": -100, "type": "supergroup", "title": "Group"},
+        "text": "hello",
+    }
+    if sender is not None:
+        message["from"] = sender
+    else:
+        message["sender_chat"] = {"id": -200, "type": "channel", "title": "Channel"}
+    return Update.model_validate({"update_id": update_id, "message": message}, context={"bot": bot})
+
+
+def test_updates_without_a_user_skip_only_handlers_that_need_the_context(db) -> None:
+    async def scenario() -> None:
+        bot = Bot("123:abc")
+        dp = Dispatcher()
+        dp.message.middleware(UserContextMiddleware(db))
+        seen: List[Any] = []
+
+        @dp.message()
+        async def with_context(message: Message, user_ctx: UserContext) -> None:
+            seen.append(user_ctx)
+
+        @dp.message()
+        async def without_context(message: Message) -> None:
+            seen.append(message.sender_chat.id)
+
+        await dp.feed_update(bot, message_update(1, None, bot))
+        await dp.feed_update(bot, message_update(2, {"id": 7, "is_bot": False, "first_name": "User"}, bot))
+        await bot.session.close()
+
+        assert seen[0] == -200
+        assert isinstance(seen[1], UserContext)
+        assert seen[1].user_id == 7
+        assert not seen[1].is_registered
+
+    asyncio.run(scenario())